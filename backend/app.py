@@ -1,66 +1,250 @@
+import contextvars
+from datetime import datetime
+import io
 import os
 import subprocess
-import tarfile
 import tempfile
-import requests
-from flask import Flask, after_this_request, request, jsonify, send_file
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import httpx
+from flask import Blueprint, Flask, request, jsonify, send_file, send_from_directory
 import json
-from openai import OpenAI
 import time
-from mongoengine import connect
-from schemas.runModel import Run, TerraformFile
+from artifact_store import ArtifactStore, artifact_file_name
+from upstream import Upstream
+from lazy import Lazy
+from workspace_pool import WorkspacePool
+from example_pack import ExamplePack, SECTIONS
+import metrics
+from metrics import stage
+import profiling
 import re
 from dotenv import load_dotenv
 import base64
-from openai import OpenAI
 from flask_cors import CORS
-from mongoengine.errors import DoesNotExist
 from urllib.parse import quote
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-app = Flask(__name__)
-
-CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
+api = Blueprint("api", __name__)
 
 # Read environment variables
 MONGODB_URI = os.getenv("MONGODB_URI")
+# Budget for the /readyz ping, so a probe fails fast while the database is unreachable.
+# Request traffic keeps the driver's default server selection timeout, which rides out
+# replica set elections.
+MONGODB_READYZ_TIMEOUT_MS = int(os.getenv("MONGODB_READYZ_TIMEOUT_MS", "2000"))
 HCPT_TOKEN = os.getenv("HCPT_TOKEN")
 HCPT_ORG = os.getenv("HCPT_ORG")        
 HCPT_WORKSPACE = os.getenv("HCPT_WORKSPACE")
+# Runs are spread over a pool of workspaces; HCPT_WORKSPACES (comma-separated) defaults to HCPT_WORKSPACE
+HCPT_WORKSPACES = [name.strip() for name in os.getenv("HCPT_WORKSPACES", HCPT_WORKSPACE or "").split(",") if name.strip()]
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ASSISTANT_ID = os.getenv("ASSISTANT_ID")
 VECTOR_STORE_ID = os.getenv("VECTOR_STORE_ID")
+CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
 
 GITHUB_ORG = "terraform-aws-modules"
-GITHUB_API_URL = "https://api.github.com"
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
 GITHUB_HEADERS = {}
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 if GITHUB_TOKEN:
     GITHUB_HEADERS["Authorization"] = f"token {GITHUB_TOKEN}"
 
 # Base URL for Terraform Cloud / HCP Terraform API
-BASE_URL = "https://app.terraform.io/api/v2"
+HCPT_ADDRESS = os.getenv("HCPT_ADDRESS", "https://app.terraform.io")
+BASE_URL = f"{HCPT_ADDRESS}/api/v2"
 API_CONTENT_TYPE = "application/vnd.api+json"
 
+# How often and for how long /upload-terraform polls for the run its upload queued
+HCPT_RUN_POLL_INTERVAL = float(os.getenv("HCPT_RUN_POLL_INTERVAL", "1"))
+HCPT_RUN_POLL_TIMEOUT = float(os.getenv("HCPT_RUN_POLL_TIMEOUT", "30"))
+
 MISSING_HCPT_TOKEN_RESPONSE = {"error": "Missing HCPT_TOKEN environment variable."}
 MISSING_RUN_ID_RESPONSE = {"error": "Missing 'run_id' in JSON payload."}
 
-def get_workspace_id():
-    """
-    Retrieve the workspace ID given HCPT_ORG and HCPT_WORKSPACE.
-    """
-    url = f"{BASE_URL}/organizations/{HCPT_ORG}/workspaces/{HCPT_WORKSPACE}"
-    headers = {
+# Limits for bulk operations: runs per request, worker pool size and concurrent calls per upstream.
+# A bulk fix has to finish within the gunicorn worker timeout, so larger batches are refused.
+BULK_FIX_MAX_RUNS = int(os.getenv("BULK_FIX_MAX_RUNS", "16"))
+BULK_FIX_MAX_WORKERS = int(os.getenv("BULK_FIX_MAX_WORKERS", "8"))
+HCPT_MAX_CONCURRENCY = int(os.getenv("HCPT_MAX_CONCURRENCY", "4"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+hcpt_semaphore = threading.BoundedSemaphore(HCPT_MAX_CONCURRENCY)
+openai_semaphore = threading.BoundedSemaphore(OPENAI_MAX_CONCURRENCY)
+
+# Limits for project archives sent to /upload-terraform, and how many modules are validated at once
+ARCHIVE_MAX_BYTES = int(os.getenv("ARCHIVE_MAX_BYTES", str(50 * 1024 * 1024)))
+ARCHIVE_MAX_EXTRACTED_BYTES = int(os.getenv("ARCHIVE_MAX_EXTRACTED_BYTES", str(200 * 1024 * 1024)))
+ARCHIVE_MAX_FILES = int(os.getenv("ARCHIVE_MAX_FILES", "5000"))
+MODULE_VALIDATE_MAX_WORKERS = int(os.getenv("MODULE_VALIDATE_MAX_WORKERS", "8"))
+# Largest request body accepted at all: an archive at the limit plus room for the multipart
+# framing and other form fields. Werkzeug refuses bigger bodies before spooling them to disk.
+MAX_REQUEST_BYTES = ARCHIVE_MAX_BYTES + 1024 * 1024
+
+# Upper bound on concurrent workspace lookups when a request fans out over the pool
+WORKSPACE_FANOUT_MAX_WORKERS = int(os.getenv("WORKSPACE_FANOUT_MAX_WORKERS", "8"))
+
+# Upper bound on concurrent assistant runs for speculative /generate-tf requests
+GENERATE_MAX_CANDIDATES = int(os.getenv("GENERATE_MAX_CANDIDATES", "4"))
+ASSISTANT_RUN_FAILED_STATUSES = ("failed", "cancelled", "expired", "incomplete")
+
+# Shared pooled HTTP client (HCP Terraform, OpenAI), one per process
+upstream = Upstream(
+    max_connections=int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "200")),
+    timeout=float(os.getenv("UPSTREAM_TIMEOUT", "60")),
+)
+
+# Generated and fixed Terraform files are kept in a content-addressed store so they can be
+# downloaded again or uploaded as a run without another LLM call.
+artifact_store = ArtifactStore(
+    max_bytes=int(os.getenv("ARTIFACT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    spill_dir=os.getenv("ARTIFACT_SPILL_DIR"),
+    spill_max_bytes=int(os.getenv("ARTIFACT_SPILL_MAX_BYTES", str(512 * 1024 * 1024))),
+)
+
+workspace_pool = WorkspacePool(HCPT_WORKSPACES)
+
+# Example corpus collected by /store-readmes, packed into one data file plus an offset index
+example_pack = ExamplePack(os.getenv("EXAMPLES_PACK_DIR", "examples_pack"))
+
+# Opt-in sampling profiler (PROFILE_ENABLED=1); None when disabled
+profiler = profiling.profiler_from_env()
+
+
+# openai, mongoengine, requests and tarfile are imported where they're first needed, and
+# the clients below are built on first use, so a new worker can serve /healthz right away.
+def build_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY, http_client=upstream.http)
+
+
+def connect_mongo():
+    from mongoengine import connect
+    return connect(host=MONGODB_URI)
+
+
+def disconnect_mongo(_connection):
+    from mongoengine import disconnect
+    disconnect()
+
+
+# Per-process lazy singletons; reset by shutdown_app() since none is safe to share across a fork
+# The OpenAI client sends through upstream.http, which upstream.stop() closes
+openai_client = Lazy(build_openai_client)
+mongo = Lazy(connect_mongo, close=disconnect_mongo)
+
+def hcp_headers():
+    """Headers for HCP Terraform API requests."""
+    return {
         "Authorization": f"Bearer {HCPT_TOKEN}",
         "Content-Type": API_CONTENT_TYPE,
     }
-    resp = requests.get(url, headers=headers)
+
+
+def call_upstream(upstream_name, stage_name, method, url, **kwargs):
+    """Send a request through the shared client, timed as a stage of the current request."""
+    with stage(stage_name, upstream=upstream_name) as timer:
+        resp = upstream.request(method, url, **kwargs)
+        timer.status = resp.status_code
+    return resp
+
+
+def map_concurrently(fn, items, max_workers):
+    """
+    Call fn on every item on a small thread pool and return the results in item order, with
+    an item's exception in place of its result if it raised. Each call runs in a copy of the
+    request context so its stages are attributed to the current route.
+    """
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+    return results
+
+
+def get_workspace(name):
+    """
+    Retrieve a workspace in HCPT_ORG by name and return its JSON:API data.
+    """
+    url = f"{BASE_URL}/organizations/{HCPT_ORG}/workspaces/{quote(name, safe='')}"
+    resp = call_upstream("hcp", "workspace_lookup", "GET", url, headers=hcp_headers())
     if resp.status_code != 200:
-        raise Exception(f"Failed to look up workspace: {resp.text}")
-    return resp.json()["data"]["id"]
+        raise Exception(f"Failed to look up workspace {name}: {resp.text}")
+    workspace = resp.json()["data"]
+    workspace_pool.workspace_ids[name] = workspace["id"]
+    return workspace
+
+
+def get_workspace_id(name):
+    """Workspace ID for a workspace name, looked up once and then cached."""
+    workspace_id = workspace_pool.workspace_ids.get(name)
+    if workspace_id is None:
+        workspace_id = get_workspace(name)["id"]
+    return workspace_id
+
+
+def get_pool_workspace_ids():
+    """Workspace IDs for every workspace in the pool, as a {name: id} dict in pool order."""
+    workspace_ids = map_concurrently(get_workspace_id, workspace_pool.names, WORKSPACE_FANOUT_MAX_WORKERS)
+    for workspace_id in workspace_ids:
+        if isinstance(workspace_id, Exception):
+            raise workspace_id
+    return dict(zip(workspace_pool.names, workspace_ids))
+
+
+def get_queue_depth(workspace_id):
+    """Number of unfinished (queued, planning, awaiting confirmation or applying) runs in a workspace."""
+    url = f"{BASE_URL}/workspaces/{workspace_id}/runs"
+    params = {"filter[status_group]": "non_final", "page[size]": 1}
+    resp = call_upstream("hcp", "queue_depth", "GET", url, headers=hcp_headers(), params=params)
+    if resp.status_code != 200:
+        raise Exception(f"Failed to fetch runs for workspace {workspace_id}: {resp.text}")
+    body = resp.json()
+    return body.get("meta", {}).get("pagination", {}).get("total-count", len(body.get("data", [])))
+
+
+def acquire_workspace():
+    """
+    Reserve the least-busy workspace in the pool for a new run and return (name, workspace ID).
+    Locked workspaces and workspaces that can't be inspected are skipped. The caller must
+    call workspace_pool.release(name) once the run is queued upstream or has failed.
+    """
+    def inspect(name):
+        workspace = get_workspace(name)
+        if workspace["attributes"].get("locked"):
+            return None
+        return get_queue_depth(workspace["id"])
+
+    results = map_concurrently(inspect, workspace_pool.names, WORKSPACE_FANOUT_MAX_WORKERS)
+    queue_depths = {}
+    for name, result in zip(workspace_pool.names, results):
+        if isinstance(result, Exception):
+            print(f"Skipping workspace {name}: {result}")
+        elif result is not None:
+            queue_depths[name] = result
+
+    name = workspace_pool.acquire(queue_depths)
+    return name, workspace_pool.workspace_ids[name]
+
+
+def send_artifact(artifact_id, content, file_name):
+    """Return a stored artifact as a download, tagged with its artifact ID."""
+    response = send_file(
+        io.BytesIO(content),
+        as_attachment=True,
+        download_name=file_name,
+        mimetype="text/plain"
+    )
+    response.headers["X-Artifact-Id"] = artifact_id
+    return response
 
 
 def clean_up_temp_dir(path):
@@ -76,38 +260,57 @@ def clean_up_temp_dir(path):
         pass  # best-effort cleanup
 
 def get_readme_embedding(readme_text):
-    response = client.embeddings.create(input=readme_text,
-    model="text-embedding-ada-002")
+    with stage("embedding", upstream="openai"):
+        response = openai_client.get().embeddings.create(input=readme_text,
+        model="text-embedding-ada-002")
     # The embedding is usually found in the first element of the data list.
     embedding = response.data[0].embedding
     return embedding
 
-def upload_to_vector_store(file_path):
+def upload_to_vector_store(file_name, content):
     """
     Placeholder function for uploading a file to your vector store via the OpenAI client.
     Replace the content of this function with your actual upload logic.
     """
     try:
         # Example: using a hypothetical method on openai_client.
-        response = client.files.create(file=open(file_path, "rb"),
-                                       purpose="assistants")
+        with stage("upload_file", upstream="openai"):
+            response = openai_client.get().files.create(file=(file_name, content),
+                                           purpose="assistants")
         file_id = response.id
         print("FILE ID:", file_id)
         return file_id
     except Exception as e:
-        print(f"Error uploading file {file_path}: {e}")
+        print(f"Error uploading file {file_name}: {e}")
         return None
 
+def combine_example(repo_name, example_name, sections):
+    """
+    Build the combined text uploaded to the vector store for one packed example:
+    a header, then README (if present), variables.tf, versions.tf, main.tf and outputs.tf.
+    """
+    combined = f"# Repo: {repo_name}, Example: {example_name}" + "\n\n"
+    if sections.get("readme"):
+        combined += str(sections["readme"], "utf-8") + "\n\n"
+    combined += "\n\n".join(f"### {name}.tf\n\n" + str(sections[name], "utf-8") for name in SECTIONS[1:])
+    return combined
+
 def get_repos(org):
+    import requests
     url = f"{GITHUB_API_URL}/orgs/{org}/repos?per_page=100"
-    response = requests.get(url, headers=GITHUB_HEADERS)
+    with stage("list_repos", upstream="github") as timer:
+        response = requests.get(url, headers=GITHUB_HEADERS)
+        timer.status = response.status_code
     if response.status_code != 200:
         return []
     return response.json()
 
 def get_contents(repo, path):
+    import requests
     url = f"{GITHUB_API_URL}/repos/{GITHUB_ORG}/{repo}/contents/{path}"
-    response = requests.get(url, headers=GITHUB_HEADERS)
+    with stage("get_contents", upstream="github") as timer:
+        response = requests.get(url, headers=GITHUB_HEADERS)
+        timer.status = response.status_code
     if response.status_code == 200:
         return response.json()
     return None
@@ -127,6 +330,8 @@ def get_file_from_folder(repo, folder_path, target_file):
     Fetches the content of target_file (e.g. main.tf) from a given folder in a repo.
     Returns a tuple (content, html_url) if found; otherwise, (None, None).
     """
+    import requests
+
     contents = get_contents(repo, folder_path)
     if not contents:
         return None, None
@@ -136,7 +341,9 @@ def get_file_from_folder(repo, folder_path, target_file):
         if item.get("type") != "file" or item.get("name", "").lower() != target_file_lower:
             continue
 
-        file_response = requests.get(item["url"], headers=GITHUB_HEADERS)
+        with stage("get_file", upstream="github") as timer:
+            file_response = requests.get(item["url"], headers=GITHUB_HEADERS)
+            timer.status = file_response.status_code
         if file_response.status_code != 200:
             continue
 
@@ -146,27 +353,161 @@ def get_file_from_folder(repo, folder_path, target_file):
 
     return None, None
 
-@app.route("/store-readmes", methods=["POST"])
+def run_terraform_checks(work_dir, init_args=("-input=false",)):
+    """
+    Run terraform init, terraform validate and TFLint in work_dir.
+    Returns None if every check passes, otherwise an error dict describing the first failure.
+    """
+    # Initialize Terraform
+    with stage("terraform_init") as timer:
+        init_result = subprocess.run(["terraform", "init", *init_args], cwd=work_dir, capture_output=True, text=True)
+        timer.status = "ok" if init_result.returncode == 0 else "failed"
+    if init_result.returncode != 0:
+        return {"error": "Terraform init failed", "details": init_result.stderr}
+
+    # Run Terraform validate
+    with stage("terraform_validate") as timer:
+        validate_result = subprocess.run(["terraform", "validate"], cwd=work_dir, capture_output=True, text=True)
+        timer.status = "ok" if validate_result.returncode == 0 else "failed"
+    if validate_result.returncode != 0:
+        return {"error": "Terraform validate failed", "details": validate_result.stderr}
+
+    # Run TFLint in JSON format
+    with stage("tflint"):
+        tflint_result = subprocess.run(["tflint", "-f", "json"], cwd=work_dir, capture_output=True, text=True)
+    try:
+        lint_output = json.loads(tflint_result.stdout)
+        if lint_output.get("issues"):
+            return {"error": "TFLint found issues", "details": lint_output["issues"]}
+    except json.JSONDecodeError as e:
+        # If TFLint output cannot be parsed as JSON, consider it a failure.
+        return {"error": "Failed to parse TFLint output", "details": str(e)}
+    return None
+
+
+def validate_modules(project_dir, modules):
+    """
+    Run the Terraform checks for each module directory of an extracted project in
+    parallel, so validation takes about as long as the slowest module. Returns None if
+    every module passes, otherwise an error dict with the failures keyed by module path.
+    """
+    max_workers = min(MODULE_VALIDATE_MAX_WORKERS, len(modules))
+    init_args = ("-input=false", "-backend=false")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Run each check in a copy of the request context so its stages are attributed to this route
+        futures = {
+            module: executor.submit(
+                contextvars.copy_context().run, run_terraform_checks, os.path.join(project_dir, module), init_args
+            )
+            for module in modules
+        }
+        errors = {module: future.result() for module, future in futures.items()}
+
+    failed = {module: error for module, error in errors.items() if error}
+    if failed:
+        return {"error": f"Validation failed for {len(failed)} of {len(modules)} module(s).", "modules": failed}
+    return None
+
+
+def prepare_archive_upload(upload, temp_dir):
+    """
+    Save an uploaded .tar.gz or .zip project, extract it under temp_dir with size limits
+    and validate every module directory. A single top-level directory wrapping the whole
+    project is stripped, and the root module must then be at the top of the archive, since
+    that is where HCP Terraform runs. Returns (tar_path, tf_files, None), where tar_path
+    is the .tar.gz to upload as the configuration version and tf_files lists the
+    (relative path, content) of each .tf file, or (None, None, error dict).
+    """
+    from archive import ArchiveError, archive_format, extract_tar_gz, extract_zip, module_dirs, pack_tar_gz, save_upload, strip_common_root
+
+    fmt = archive_format(upload.filename)
+    if fmt is None:
+        return None, None, {"error": f"File {upload.filename} is not a .tar.gz, .tgz or .zip archive."}
+
+    upload_path = os.path.join(temp_dir, "upload.tar.gz" if fmt == "tar" else "upload.zip")
+    project_dir = os.path.join(temp_dir, "project")
+    os.makedirs(project_dir)
+    try:
+        with stage("extract_archive"):
+            save_upload(upload.stream, upload_path, ARCHIVE_MAX_BYTES)
+            extract = extract_tar_gz if fmt == "tar" else extract_zip
+            rel_paths = extract(upload_path, project_dir, ARCHIVE_MAX_EXTRACTED_BYTES, ARCHIVE_MAX_FILES)
+    except ArchiveError as e:
+        return None, None, {"error": "Invalid archive.", "details": str(e)}
+
+    root, rel_paths = strip_common_root(rel_paths)
+    if root:
+        project_dir = os.path.join(project_dir, root)
+
+    modules = module_dirs(rel_paths)
+    if not modules:
+        return None, None, {"error": "Archive contains no .tf files."}
+    if "." not in modules:
+        return None, None, {
+            "error": "Archive has no .tf files at its root.",
+            "details": f"The root module must be at the top of the archive; found .tf files only in: {', '.join(modules)}",
+        }
+
+    tf_files = []
+    for rel_path in rel_paths:
+        if not rel_path.endswith(".tf"):
+            continue
+        try:
+            with open(os.path.join(project_dir, rel_path), "r", encoding="utf-8") as f:
+                tf_files.append((rel_path, f.read()))
+        except UnicodeDecodeError:
+            return None, None, {"error": f"File {rel_path} is not valid UTF-8."}
+
+    check_error = validate_modules(project_dir, modules)
+    if check_error:
+        return None, None, check_error
+
+    if fmt == "tar" and not root:
+        # Forwarded exactly as uploaded
+        return upload_path, tf_files, None
+
+    # Configuration versions must be .tar.gz with the root module at the top, so a .zip or
+    # an archive with a wrapping directory is repacked from the extracted files
+    tar_path = os.path.join(temp_dir, "content.tar.gz")
+    with stage("package_tarball"):
+        pack_tar_gz(project_dir, rel_paths, tar_path)
+    return tar_path, tf_files, None
+
+
+def validate_tf_code(code):
+    """
+    Validate a single generated Terraform file locally, without configuring a backend.
+    Returns None if the code is valid, otherwise an error dict.
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(temp_dir, "main.tf"), "w") as f:
+            f.write(code)
+        return run_terraform_checks(temp_dir, init_args=("-input=false", "-backend=false"))
+    finally:
+        clean_up_temp_dir(temp_dir)
+
+
+@api.route("/store-readmes", methods=["POST"])
 def store_examples():
     """
     Fetches repositories from the 'terraform-aws-modules' GitHub organization,
     iterates over each repo to look for a top-level 'examples' folder, then for each
     example folder verifies that it contains main.tf, variables.tf, outputs.tf, and versions.tf.
-    Optionally, a README.md may be present. The files are combined into a single text file
-    (with README at the top if available, then variables.tf, versions.tf, main.tf, outputs.tf),
-    saved locally, and then uploaded to a vector store via the OpenAI client.
+    Optionally, a README.md may be present. Each example's files are appended to the
+    example pack. The ingested examples are then read back in one sequential pass over the
+    pack, combined into a single text file each (with README at the top if available, then
+    variables.tf, versions.tf, main.tf, outputs.tf) and uploaded to a vector store via the
+    OpenAI client.
     """
 
     repos = get_repos(GITHUB_ORG)
     if not repos:
         return jsonify({"error": "No repositories found in organization."}), 404
 
-    # Ensure that the directory for storing text files exists.
-    output_dir = "examples_combined"
-    os.makedirs(output_dir, exist_ok=True)
-
     total_examples = 0
     file_ids = []
+    ingested = set()  # (repo, example) pairs packed by this call
 
     # Required files (README is optional)
     required_files = ["main.tf", "variables.tf", "outputs.tf", "versions.tf"]
@@ -198,236 +539,345 @@ def store_examples():
 
             # Attempt to get the optional README.
             readme_content, _ = get_file_from_folder(repo_name, folder_path, optional_file)
-            
-            # Build header for the combined file.
-            header = f"# Repo: {repo_name}, Example: {example_name}"
-            
-            # Combine the file contents.
-            # Order: README (if exists), variables.tf, versions.tf, main.tf, outputs.tf.
-            combined = header + "\n\n"
-            if readme_content:
-                combined += readme_content + "\n\n"
-            combined += "### variables.tf\n\n" + file_contents["variables.tf"] + "\n\n"
-            combined += "### versions.tf\n\n" + file_contents["versions.tf"] + "\n\n"
-            combined += "### main.tf\n\n" + file_contents["main.tf"] + "\n\n"
-            combined += "### outputs.tf\n\n" + file_contents["outputs.tf"]
-
-            # Define a file path to save the combined content.
-            safe_repo = repo_name.replace(" ", "_")
-            safe_example = example_name.replace(" ", "_")
-            file_name = f"{safe_repo}_{safe_example}_combined.txt"
-            file_path = os.path.join(output_dir, file_name)
 
+            # Append the example to the pack, one section per file.
+            sections = {
+                "readme": readme_content or None,
+                "variables": file_contents["variables.tf"],
+                "versions": file_contents["versions.tf"],
+                "main": file_contents["main.tf"],
+                "outputs": file_contents["outputs.tf"],
+            }
             try:
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(combined)
-                print(f"Saved combined file for {repo_name}/{example_name} to {file_path}")
+                with stage("write_example"):
+                    appended = example_pack.append(repo_name, example_name, sections)
+                if appended:
+                    print(f"Packed {repo_name}/{example_name} into {example_pack.data_path}")
+                else:
+                    print(f"{repo_name}/{example_name} is unchanged in {example_pack.data_path}")
             except Exception as e:
-                print(f"Error writing file {file_path}: {e}")
+                print(f"Error packing {repo_name}/{example_name}: {e}")
                 continue
+            ingested.add((repo_name, example_name))
 
-            # Prepare metadata (extend this with more details as needed).
-            metadata = {
-                "repo": repo_name,
-                "example": example_name,
-                "folder_path": folder_path,
-            }
+    # Combine the packed sections for the vector store, reading the pack sequentially.
+    for repo_name, example_name, sections in example_pack.iter_examples():
+        if (repo_name, example_name) not in ingested:
+            continue
+        safe_repo = repo_name.replace(" ", "_")
+        safe_example = example_name.replace(" ", "_")
+        file_name = f"{safe_repo}_{safe_example}_combined.txt"
+        combined = combine_example(repo_name, example_name, sections)
+
+        # Prepare metadata (extend this with more details as needed).
+        metadata = {
+            "repo": repo_name,
+            "example": example_name,
+            "folder_path": f"examples/{example_name}",
+        }
 
-            # Upload the file to the vector store.
-            file_id = upload_to_vector_store(file_path)
-            if file_id:
-                file_ids.append(file_id)
+        # Upload the file to the vector store.
+        file_id = upload_to_vector_store(file_name, combined.encode("utf-8"))
+        if file_id:
+            file_ids.append(file_id)
 
-            total_examples += 1
+        total_examples += 1
 
     # Upload files in batches to the vector store.
     chunk_size = 10
     batch_results = []
     for i in range(0, len(file_ids), chunk_size):
         chunk = file_ids[i:min(i + chunk_size, len(file_ids))]
-        batch_add = client.beta.vector_stores.file_batches.create(
-            vector_store_id=VECTOR_STORE_ID,
-            file_ids=chunk
-        )
+        with stage("vector_store_batch", upstream="openai"):
+            batch_add = openai_client.get().beta.vector_stores.file_batches.create(
+                vector_store_id=VECTOR_STORE_ID,
+                file_ids=chunk
+            )
         # Optionally, wait briefly before processing the next chunk.
-        time.sleep(1)
+        with stage("batch_pause"):
+            time.sleep(1)
         print("Batch status for chunk starting at index", i, ":", batch_add.status)
         batch_results.append({"file_ids": chunk, "batch_status": batch_add.status})
     
     return jsonify({"message": f"Processed and uploaded combined files for {total_examples} example(s) from GitHub.", "batches": batch_results}), 200
 
-@app.route("/upload-terraform", methods=["POST"])
-def upload_terraform():
+@api.route("/examples", methods=["GET"])
+def list_examples():
     """
-    Accepts uploaded Terraform .tf files, packages them into a tar.gz,
-    triggers an HCP Terraform run via the API, and stores the run details
-    including the .tf files and their contents in MongoDB.
+    List the examples in the example pack, optionally only those of one repo
+    (query parameter "repo"), with the size in bytes of each section.
     """
-    if not HCPT_TOKEN or not HCPT_ORG or not HCPT_WORKSPACE:
-        return jsonify({"error": "Server missing required environment variables."}), 500
-
-    # Collect uploaded .tf files (multiple files allowed)
-    uploaded_files = request.files.getlist("tf_files")
-    if not uploaded_files:
-        return jsonify({"error": "No files received."}), 400
-
-    # Create a temporary directory for the uploaded files
-    temp_dir = tempfile.mkdtemp()
-    file_paths = []
-    tf_files_data = []  # To hold file names and contents for MongoDB
-
-    for f in uploaded_files:
-        filename = f.filename
-        if not filename.endswith(".tf"):
-            clean_up_temp_dir(temp_dir)
-            return jsonify({"error": f"File {filename} is not a .tf file."}), 400
-
-        # Save file to temporary directory
-        save_path = os.path.join(temp_dir, filename)
-        f.save(save_path)
-        file_paths.append(save_path)
-
-        # Read file content for MongoDB
-        with open(save_path, "r") as file:
-            content = file.read()
-            tf_files_data.append(TerraformFile(file_name=filename, file_content=content))
+    repo = request.args.get("repo")
+    examples = [
+        {
+            "repo": repo_name,
+            "example": example_name,
+            "sections": {name: len(view) for name, view in sections.items()},
+        }
+        for repo_name, example_name, sections in example_pack.iter_examples(repo)
+    ]
+    return jsonify({"examples": examples}), 200
 
-    # Run Terraform linting before packaging
-    # Initialize Terraform
-    init_result = subprocess.run(["terraform", "init", "-input=false"], cwd=temp_dir, capture_output=True, text=True)
-    if init_result.returncode != 0:
-        clean_up_temp_dir(temp_dir)
-        return jsonify({"error": "Terraform init failed", "details": init_result.stderr}), 400
 
-    # Run Terraform validate
-    validate_result = subprocess.run(["terraform", "validate"], cwd=temp_dir, capture_output=True, text=True)
-    if validate_result.returncode != 0:
-        clean_up_temp_dir(temp_dir)
-        return jsonify({"error": "Terraform validate failed", "details": validate_result.stderr}), 400
-
-    # Run TFLint in JSON format
-    tflint_result = subprocess.run(["tflint", "-f", "json"], cwd=temp_dir, capture_output=True, text=True)
-    try:
-        lint_output = json.loads(tflint_result.stdout)
-        if lint_output.get("issues"):
-            clean_up_temp_dir(temp_dir)
-            return jsonify({"error": "TFLint found issues", "details": lint_output["issues"]}), 400
-    except json.JSONDecodeError as e:
-        # If TFLint output cannot be parsed as JSON, consider it a failure.
-        clean_up_temp_dir(temp_dir)
-        return jsonify({"error": "Failed to parse TFLint output", "details": str(e)}), 400
+@api.route("/examples/<repo>/<example>", methods=["GET"])
+def get_example(repo, example):
+    """
+    Fetch one packed example. With a "section" query parameter (readme, variables,
+    versions, main or outputs) only that section is returned, as plain text.
+    """
+    sections = example_pack.sections(repo, example)
+    if sections is None:
+        return jsonify({"error": f"No example {example} found for repo {repo}."}), 404
+
+    section = request.args.get("section")
+    if section is not None:
+        if section not in SECTIONS:
+            return jsonify({"error": f"Unknown section {section}. Expected one of: {', '.join(SECTIONS)}."}), 400
+        if section not in sections:
+            return jsonify({"error": f"Example {repo}/{example} has no {section} section."}), 404
+        return bytes(sections[section]), 200, {"Content-Type": "text/plain; charset=utf-8"}
 
-    # Create a tar.gz archive from the .tf files
-    tar_path = os.path.join(temp_dir, "content.tar.gz")
-    with tarfile.open(tar_path, "w:gz") as tar:
-        for path in file_paths:
-            arcname = os.path.basename(path)
-            tar.add(path, arcname=arcname)
+    return jsonify({
+        "repo": repo,
+        "example": example,
+        "sections": {name: str(view, "utf-8") for name, view in sections.items()},
+    }), 200
 
-    # Get workspace ID
-    try:
-        workspace_id = get_workspace_id()
-    except Exception as e:
-        clean_up_temp_dir(temp_dir)
-        return jsonify({"error": str(e)}), 400
+def queue_configuration_run(workspace_id, tar_path):
+    """
+    Create a configuration version in the workspace, upload the tar.gz at tar_path to it
+    and wait for the run the upload queues. The run is matched on its configuration
+    version, so concurrent uploads to the same workspace can't pick up each other's run.
+    Returns (run_id, None) on success or (None, error dict).
+    """
+    import requests
 
     # Create a new configuration version
     create_cv_url = f"{BASE_URL}/workspaces/{workspace_id}/configuration-versions"
-    headers = {
-        "Authorization": f"Bearer {HCPT_TOKEN}",
-        "Content-Type": API_CONTENT_TYPE,
-    }
+    headers = hcp_headers()
     payload = {
         "data": {
             "type": "configuration-versions"
         }
     }
-    resp = requests.post(create_cv_url, headers=headers, json=payload)
+    with stage("create_configuration_version", upstream="hcp") as timer:
+        resp = requests.post(create_cv_url, headers=headers, json=payload)
+        timer.status = resp.status_code
     if resp.status_code != 201:
-        clean_up_temp_dir(temp_dir)
-        return jsonify({"error": "Failed to create configuration version.", "details": resp.text}), 400
+        return None, {"error": "Failed to create configuration version.", "details": resp.text}
 
-    upload_url = resp.json()["data"]["attributes"]["upload-url"]
+    configuration_version = resp.json()["data"]
+    upload_url = configuration_version["attributes"]["upload-url"]
 
     # Upload the tar.gz file to the signed upload URL
     with open(tar_path, "rb") as f:
         put_headers = {
             "Content-Type": "application/octet-stream"
         }
-        put_resp = requests.put(upload_url, data=f, headers=put_headers)
+        with stage("upload_configuration", upstream="hcp") as timer:
+            put_resp = requests.put(upload_url, data=f, headers=put_headers)
+            timer.status = put_resp.status_code
 
     if put_resp.status_code not in (200, 201):
-        clean_up_temp_dir(temp_dir)
-        return jsonify({"error": "Failed to upload configuration file.", "details": put_resp.text}), 400
+        return None, {"error": "Failed to upload configuration file.", "details": put_resp.text}
 
-    # Wait briefly to ensure the run is triggered
-    time.sleep(2)
-
-    # Fetch the most recent run for the workspace
+    # Poll the workspace's runs (newest first) for the one created from this configuration version
     runs_url = f"{BASE_URL}/workspaces/{workspace_id}/runs"
-    runs_resp = requests.get(runs_url, headers=headers)
+    deadline = time.monotonic() + HCPT_RUN_POLL_TIMEOUT
+    while True:
+        with stage("run_trigger_wait"):
+            time.sleep(HCPT_RUN_POLL_INTERVAL)
+        with stage("find_run", upstream="hcp") as timer:
+            runs_resp = requests.get(runs_url, headers=headers)
+            timer.status = runs_resp.status_code
+        if runs_resp.status_code != 200:
+            return None, {"error": "Failed to fetch runs.", "details": runs_resp.text}
 
-    if runs_resp.status_code != 200:
-        clean_up_temp_dir(temp_dir)
-        return jsonify({"error": "Failed to fetch runs.", "details": runs_resp.text}), 400
+        for run in runs_resp.json()["data"]:
+            relationship = run.get("relationships", {}).get("configuration-version", {})
+            if (relationship.get("data") or {}).get("id") == configuration_version["id"]:
+                return run["id"], None
 
-    runs_data = runs_resp.json()
-    if not runs_data["data"]:
-        clean_up_temp_dir(temp_dir)
-        return jsonify({"error": "No runs found after configuration upload."}), 400
+        if time.monotonic() >= deadline:
+            return None, {"error": "No run found for the uploaded configuration version."}
 
-    # Get the most recent run ID
-    latest_run = runs_data["data"][0]
-    run_id = latest_run["id"]
 
-    # Save run details and .tf files to MongoDB
-    try:
-        run_doc = Run(
-            run_id=run_id,
-            tf_files=tf_files_data,
-            workspace_id=workspace_id,
-            organization_name=HCPT_ORG
-        )
-        run_doc.save()
-    except Exception as e:
-        clean_up_temp_dir(temp_dir)
-        return jsonify({"error": "Failed to save run details to MongoDB.", "details": str(e)}), 500
+@api.app_errorhandler(413)
+def request_too_large(_error):
+    """Answer bodies over MAX_CONTENT_LENGTH in the API's JSON error format."""
+    return jsonify({"error": f"Request body is larger than {MAX_REQUEST_BYTES} bytes."}), 413
 
-    # Clean up temporary files
-    clean_up_temp_dir(temp_dir)
 
-    # Return success message with run_id
-    return jsonify({
-        "message": "Terraform configuration uploaded successfully. Run triggered and stored in MongoDB.",
-        "run_id": run_id
-    }), 200
+@api.route("/upload-terraform", methods=["POST"])
+def upload_terraform():
+    """
+    Accepts uploaded Terraform .tf files, packages them into a tar.gz,
+    triggers an HCP Terraform run via the API, and stores the run details
+    including the .tf files and their contents in MongoDB.
+    Previously generated or fixed files can be included by passing their
+    IDs in one or more "artifact_id" form fields instead of re-uploading them.
+    A whole project (modules, .tfvars, lock files) can instead be sent as a
+    single .tar.gz or .zip in the "archive" field.
+    """
+    if not HCPT_TOKEN or not HCPT_ORG or not HCPT_WORKSPACES:
+        return jsonify({"error": "Server missing required environment variables."}), 500
+
+    import tarfile
+    mongo.get()
+    from schemas.runModel import Run, TerraformFile
+
+    # Collect uploaded .tf files (multiple files allowed) or a single project archive
+    archive_upload = request.files.get("archive")
+    uploaded_files = request.files.getlist("tf_files")
+    artifact_ids = request.form.getlist("artifact_id")
+    if archive_upload and (uploaded_files or artifact_ids):
+        return jsonify({"error": "Send either an archive or individual files, not both."}), 400
+    if not archive_upload and not uploaded_files and not artifact_ids:
+        return jsonify({"error": "No files received."}), 400
+
+    artifacts = []
+    for artifact_id in artifact_ids:
+        content = artifact_store.get(artifact_id)
+        if content is None:
+            return jsonify({"error": f"No artifact found with artifact_id: {artifact_id}"}), 404
+        artifacts.append((content, artifact_file_name(artifact_id)))
+
+    # Create a temporary directory for the uploaded files
+    temp_dir = tempfile.mkdtemp()
+    try:
+        if archive_upload:
+            tar_path, tf_files, error = prepare_archive_upload(archive_upload, temp_dir)
+            if error:
+                return jsonify(error), 400
+            tf_files_data = [TerraformFile(file_name=name, file_content=content) for name, content in tf_files]
+        else:
+            file_paths = []
+            tf_files_data = []  # To hold file names and contents for MongoDB
+            # Uploaded files and artifacts share one flat directory, so every name must be unique
+            seen_names = set()
+
+            for f in uploaded_files:
+                filename = f.filename or ""
+                if not filename.endswith(".tf"):
+                    return jsonify({"error": f"File {filename} is not a .tf file."}), 400
+                if os.path.basename(filename) != filename:
+                    return jsonify({"error": f"File name {filename} must not contain a path."}), 400
+                if filename in seen_names:
+                    return jsonify({"error": f"Duplicate file name: {filename}"}), 400
+                seen_names.add(filename)
+
+                # Save file to temporary directory
+                save_path = os.path.join(temp_dir, filename)
+                f.save(save_path)
+                file_paths.append(save_path)
+
+                # Read file content for MongoDB
+                with open(save_path, "r") as file:
+                    content = file.read()
+                    tf_files_data.append(TerraformFile(file_name=filename, file_content=content))
+
+            for content, filename in artifacts:
+                if filename in seen_names:
+                    return jsonify({"error": f"Duplicate file name: {filename}"}), 400
+                seen_names.add(filename)
+                save_path = os.path.join(temp_dir, filename)
+                with open(save_path, "wb") as file:
+                    file.write(content)
+                file_paths.append(save_path)
+                tf_files_data.append(TerraformFile(file_name=filename, file_content=content.decode("utf-8")))
+
+            # Run Terraform linting before packaging
+            check_error = run_terraform_checks(temp_dir)
+            if check_error:
+                return jsonify(check_error), 400
+
+            # Create a tar.gz archive from the .tf files
+            tar_path = os.path.join(temp_dir, "content.tar.gz")
+            with stage("package_tarball"), tarfile.open(tar_path, "w:gz") as tar:
+                for path in file_paths:
+                    arcname = os.path.basename(path)
+                    tar.add(path, arcname=arcname)
+
+        # Queue the run on the least-busy workspace in the pool
+        try:
+            workspace_name, workspace_id = acquire_workspace()
+        except Exception as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            run_id, error = queue_configuration_run(workspace_id, tar_path)
+        finally:
+            workspace_pool.release(workspace_name)
+        if error:
+            return jsonify(error), 400
+
+        # Save run details and .tf files to MongoDB
+        try:
+            run_doc = Run(
+                run_id=run_id,
+                tf_files=tf_files_data,
+                workspace_id=workspace_id,
+                workspace_name=workspace_name,
+                organization_name=HCPT_ORG
+            )
+            with stage("mongo_save", upstream="mongo"):
+                run_doc.save()
+        except Exception as e:
+            return jsonify({"error": "Failed to save run details to MongoDB.", "details": str(e)}), 500
+
+        # Return success message with run_id
+        return jsonify({
+            "message": "Terraform configuration uploaded successfully. Run triggered and stored in MongoDB.",
+            "run_id": run_id,
+            "workspace": workspace_name
+        }), 200
+    finally:
+        clean_up_temp_dir(temp_dir)
 
-@app.route("/runs", methods=["GET"])
+@api.route("/runs", methods=["GET"])
 def get_runs():
     """
-    Retrieve recent runs for the configured workspace.
+    Retrieve recent runs across every workspace in the pool, merged newest first.
+    Workspaces that can't be read are listed under meta.errors; the request only fails
+    if none of them can.
     """
-    if not HCPT_TOKEN or not HCPT_ORG or not HCPT_WORKSPACE:
+    if not HCPT_TOKEN or not HCPT_ORG or not HCPT_WORKSPACES:
         return jsonify({"error": "Server missing required environment variables."}), 500
 
-    try:
-        workspace_id = get_workspace_id()
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+    def list_workspace_runs(name):
+        workspace_id = get_workspace_id(name)
+        runs_url = f"{BASE_URL}/workspaces/{workspace_id}/runs"
+        resp = call_upstream("hcp", "list_runs", "GET", runs_url, headers=hcp_headers())
+        if resp.status_code != 200:
+            raise Exception(f"Failed to fetch runs: {resp.text}")
+        return resp.json()["data"]
+
+    results = map_concurrently(list_workspace_runs, workspace_pool.names, WORKSPACE_FANOUT_MAX_WORKERS)
+    runs = []
+    errors = {}
+    for name, result in zip(workspace_pool.names, results):
+        if isinstance(result, Exception):
+            errors[name] = str(result)
+        else:
+            runs.extend(result)
+    if errors and len(errors) == len(workspace_pool.names):
+        return jsonify({"error": "Failed to fetch runs.", "details": errors}), 400
+
+    runs.sort(key=lambda run: run["attributes"].get("created-at", ""), reverse=True)
+    meta = {"workspaces": workspace_pool.names}
+    if errors:
+        meta["errors"] = errors
+    return jsonify({"data": runs, "meta": meta}), 200
 
-    runs_url = f"{BASE_URL}/workspaces/{workspace_id}/runs"
-    headers = {
-        "Authorization": f"Bearer {HCPT_TOKEN}",
-        "Content-Type": API_CONTENT_TYPE,
-    }
-    resp = requests.get(runs_url, headers=headers)
-    if resp.status_code != 200:
-        return jsonify({"error": "Failed to fetch runs.", "details": resp.text}), 400
 
-    return jsonify(resp.json()), 200
+def post_run_action(run_id, action, comment):
+    """POST a run action (apply, cancel or discard) to HCP Terraform and return the response."""
+    encoded_run_id = quote(run_id, safe='')
+    action_url = f"{BASE_URL}/runs/{encoded_run_id}/actions/{action}"
+    payload = {"comment": comment}
+    return call_upstream("hcp", f"run_{action}", "POST", action_url, headers=hcp_headers(), json=payload)
 
 
-@app.route("/approve-run", methods=["POST"])
+@api.route("/approve-run", methods=["POST"])
 def approve_run():
     """
     Approve (apply) a run that is waiting for approval.
@@ -443,22 +893,14 @@ def approve_run():
     run_id = data["run_id"]
     comment = data.get("comment", "Approved via API")
 
-    encoded_run_id = quote(run_id, safe='')
-    approve_url = f"{BASE_URL}/runs/{encoded_run_id}/actions/apply"
-    headers = {
-        "Authorization": f"Bearer {HCPT_TOKEN}",
-        "Content-Type": API_CONTENT_TYPE,
-    }
-    payload = {"comment": comment}
-
-    resp = requests.post(approve_url, headers=headers, json=payload)
+    resp = post_run_action(run_id, "apply", comment)
     if resp.status_code != 200:
         return jsonify({"error": "Failed to approve run.", "details": resp.text}), 400
 
     return jsonify({"message": f"Run {run_id} approved successfully.", "run": resp.json()}), 200
 
 
-@app.route("/cancel-run", methods=["POST"])
+@api.route("/cancel-run", methods=["POST"])
 def cancel_run():
     """
     Cancel a run by specifying the run_id and an optional comment.
@@ -474,22 +916,14 @@ def cancel_run():
     run_id = data["run_id"]
     comment = data.get("comment", "Canceled via API")
 
-    encoded_run_id = quote(run_id, safe='')
-    cancel_url = f"{BASE_URL}/runs/{encoded_run_id}/actions/cancel"
-    headers = {
-        "Authorization": f"Bearer {HCPT_TOKEN}",
-        "Content-Type": API_CONTENT_TYPE,
-    }
-    payload = {"comment": comment}
-
-    resp = requests.post(cancel_url, headers=headers, json=payload)
+    resp = post_run_action(run_id, "cancel", comment)
     if resp.status_code != 200:
         return jsonify({"error": "Failed to cancel run.", "details": resp.text}), 400
 
     return jsonify({"message": f"Run {run_id} canceled successfully.", "run": resp.json()}), 200
 
 
-@app.route("/discard-run", methods=["POST"])
+@api.route("/discard-run", methods=["POST"])
 def discard_run():
     """
     Discard a run that is waiting for confirmation (i.e. not approving it).
@@ -508,15 +942,7 @@ def discard_run():
     run_id = data["run_id"]
     comment = data.get("comment", "Discarded via API")
 
-    encoded_run_id = quote(run_id, safe='')
-    discard_url = f"{BASE_URL}/runs/{encoded_run_id}/actions/discard"
-    headers = {
-        "Authorization": f"Bearer {HCPT_TOKEN}",
-        "Content-Type": API_CONTENT_TYPE,
-    }
-    payload = {"comment": comment}
-
-    resp = requests.post(discard_url, headers=headers, json=payload)
+    resp = post_run_action(run_id, "discard", comment)
     if resp.status_code != 200:
         return jsonify({"error": "Failed to discard run.", "details": resp.text}), 400
 
@@ -528,11 +954,7 @@ def fetch_log_from_attributes(endpoint_url):
     Helper function that calls a given endpoint (apply or plan), extracts the log-read-url,
     fetches the log content, and returns the text.
     """
-    headers = {
-        "Authorization": f"Bearer {HCPT_TOKEN}",
-        "Content-Type": API_CONTENT_TYPE,
-    }
-    resp = requests.get(endpoint_url, headers=headers)
+    resp = call_upstream("hcp", "log_attributes", "GET", endpoint_url, headers=hcp_headers())
     if resp.status_code != 200:
         return None, f"Failed to fetch data from {endpoint_url}: {resp.text}"
     try:
@@ -542,7 +964,7 @@ def fetch_log_from_attributes(endpoint_url):
         if not log_url:
             return None, "log-read-url not found in response attributes."
         # Now fetch the log content from the log-read-url
-        log_resp = requests.get(log_url)
+        log_resp = call_upstream("hcp", "log_download", "GET", log_url)
         if log_resp.status_code != 200:
             return None, f"Failed to fetch log content: {log_resp.text}"
         return log_resp.text, None
@@ -550,7 +972,7 @@ def fetch_log_from_attributes(endpoint_url):
         return None, str(e)
 
 
-@app.route("/apply-log/<run_id>", methods=["GET"])
+@api.route("/apply-log/<run_id>", methods=["GET"])
 def get_apply_log(run_id):
     """
     Retrieve the apply log for a run.
@@ -565,7 +987,7 @@ def get_apply_log(run_id):
     return log_text, 200
 
 
-@app.route("/plan-log/<run_id>", methods=["GET"])
+@api.route("/plan-log/<run_id>", methods=["GET"])
 def get_plan_log(run_id):
     """
     Retrieve the plan log for a run.
@@ -579,14 +1001,23 @@ def get_plan_log(run_id):
         return jsonify({"error": "Failed to fetch plan log.", "details": error}), 400
     return log_text, 200
 
-@app.route("/get-tf/<run_id>", methods=["GET"])
+def get_run_with_tf_files(run_id):
+    """Load a stored run with only its Terraform files, or None if there is no such run."""
+    mongo.get()
+    from schemas.runModel import Run
+
+    with stage("mongo_lookup", upstream="mongo"):
+        return Run.objects.only("tf_files").filter(run_id=run_id).first()
+
+
+@api.route("/get-tf/<run_id>", methods=["GET"])
 def get_tf(run_id):
     try:
-        run_doc = Run.objects.get(run_id=run_id)
-    except DoesNotExist:
-        return jsonify({"error": f"No run found with run_id: {run_id}"}), 404
+        run_doc = get_run_with_tf_files(run_id)
     except Exception as e:
         return jsonify({"error": "Database error", "details": str(e)}), 500
+    if run_doc is None:
+        return jsonify({"error": f"No run found with run_id: {run_id}"}), 404
 
     if not run_doc.tf_files:
         return jsonify({"error": "No .tf files associated with this run."}), 400
@@ -600,21 +1031,124 @@ def get_tf(run_id):
     return jsonify({"tf_files": tf_files}), 200
 
 
-@app.route("/destroy-run", methods=["POST"])
+@api.route("/run-history", methods=["GET"])
+def get_run_history():
+    """
+    Page through runs stored in MongoDB, newest first, without calling HCP Terraform.
+    Optional query parameters: workspace_id, organization_name, page (default 1)
+    and page_size (default 20, max 100). Only metadata and file names are returned.
+
+    For deep paging pass before=<created_at ISO timestamp> instead of page: it returns the
+    runs created before that time straight from the created_at indexes rather than skipping
+    over every earlier page. Each response carries next_before and next_before_run_id, the
+    cursor for the next page (null after the last one); pass the latter as before_run_id so
+    runs sharing a created_at timestamp are neither skipped nor repeated.
+    """
+    try:
+        page = int(request.args.get("page", 1))
+        page_size = int(request.args.get("page_size", 20))
+    except ValueError:
+        return jsonify({"error": "'page' and 'page_size' must be integers."}), 400
+    if page < 1 or page_size < 1 or page_size > 100:
+        return jsonify({"error": "'page' must be >= 1 and 'page_size' between 1 and 100."}), 400
+
+    before = None
+    if request.args.get("before"):
+        if "page" in request.args:
+            return jsonify({"error": "Pass either 'page' or 'before', not both."}), 400
+        try:
+            before = datetime.fromisoformat(request.args["before"])
+        except ValueError:
+            return jsonify({"error": "'before' must be an ISO 8601 timestamp."}), 400
+    before_run_id = request.args.get("before_run_id")
+
+    mongo.get()
+    from mongoengine.queryset.visitor import Q
+    from schemas.runModel import Run, RUN_METADATA_FIELDS
+
+    filters = {}
+    for field in ("workspace_id", "organization_name"):
+        if request.args.get(field):
+            filters[field] = request.args[field]
+
+    try:
+        # run_id breaks ties between runs created in the same millisecond
+        query = Run.objects(**filters).only(*RUN_METADATA_FIELDS).order_by("-created_at", "-run_id")
+        if before is not None and before_run_id:
+            page_query = query.filter(Q(created_at__lt=before) | Q(created_at=before, run_id__lt=before_run_id))
+        elif before is not None:
+            page_query = query.filter(created_at__lt=before)
+        else:
+            page_query = query.skip((page - 1) * page_size)
+        with stage("mongo_history", upstream="mongo"):
+            total = query.count()
+            run_docs = list(page_query.limit(page_size))
+        runs = [
+            {
+                "run_id": run_doc.run_id,
+                "workspace_id": run_doc.workspace_id,
+                "workspace_name": run_doc.workspace_name,
+                "organization_name": run_doc.organization_name,
+                "created_at": run_doc.created_at.isoformat() if run_doc.created_at else None,
+                "tf_file_names": [tf.file_name for tf in run_doc.tf_files],
+            }
+            for run_doc in run_docs
+        ]
+    except Exception as e:
+        return jsonify({"error": "Database error", "details": str(e)}), 500
+
+    last_run = runs[-1] if len(runs) == page_size else None
+    return jsonify({
+        "runs": runs,
+        "page": page,
+        "page_size": page_size,
+        "total": total,
+        "next_before": last_run["created_at"] if last_run else None,
+        "next_before_run_id": last_run["run_id"] if last_run else None,
+    }), 200
+
+
+@api.route("/destroy-run", methods=["POST"])
 def destroy_run():
     """
     Trigger a Terraform destroy run.
     This route creates a new run with the 'is-destroy' flag set to true.
-    Expects an optional JSON payload with a 'message' attribute.
+    Expects a JSON payload with an optional 'message' and the workspace to destroy:
+    either a 'workspace' name from the pool, or the 'run_id' of a stored run whose
+    workspace is used. Either is required when the pool has more than one workspace.
     """
     if not HCPT_TOKEN:
         return jsonify(MISSING_HCPT_TOKEN_RESPONSE), 500
+    if not HCPT_WORKSPACES:
+        return jsonify({"error": "Server missing required environment variables."}), 500
 
     data = request.get_json() or {}
     message = data.get("message", "Destroy triggered via API")
+    workspace_name = data.get("workspace")
+    run_id = data.get("run_id")
+    if workspace_name is None and run_id is not None:
+        mongo.get()
+        from schemas.runModel import Run
+
+        with stage("mongo_lookup", upstream="mongo"):
+            run_doc = Run.objects.only("workspace_name").filter(run_id=run_id).first()
+        if run_doc is None:
+            return jsonify({"error": f"No run found with run_id: {run_id}"}), 404
+        # Runs stored before the pool existed have no workspace name; they can only be
+        # resolved while there is a single workspace
+        workspace_name = run_doc.workspace_name
+        if workspace_name is None and len(workspace_pool.names) > 1:
+            return jsonify({"error": f"Run {run_id} has no recorded workspace; pass 'workspace' instead."}), 400
+    if workspace_name is None:
+        # Destroying is never load-balanced: without a target there must be exactly one candidate
+        if len(workspace_pool.names) > 1:
+            return jsonify({"error": "'workspace' or 'run_id' is required when more than one workspace is configured."}), 400
+        workspace_name = workspace_pool.names[0]
+    if workspace_name not in workspace_pool:
+        return jsonify({"error": f"Workspace {workspace_name} is not in the workspace pool."}), 400
 
     try:
-        workspace_id = get_workspace_id()
+        workspace_id = get_workspace_id(workspace_name)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -642,22 +1176,31 @@ def destroy_run():
         "Content-Type": API_CONTENT_TYPE
     }
 
-    resp = requests.post(url, headers=headers, json=payload)
+    import requests
+
+    with stage("create_destroy_run", upstream="hcp") as timer:
+        resp = requests.post(url, headers=headers, json=payload)
+        timer.status = resp.status_code
     if resp.status_code != 201:
         return jsonify({"error": "Failed to trigger destroy run.", "details": resp.text}), 400
 
-    return jsonify({"message": "Destroy run triggered successfully.", "run": resp.text}), 200
+    return jsonify({"message": "Destroy run triggered successfully.", "workspace": workspace_name, "run": resp.text}), 200
 
 # ----------------------------------------------------------
 # New Route: Generate Terraform Code from a Prompt Using OpenAI
 # ----------------------------------------------------------
-@app.route("/generate-tf", methods=["POST"])
+@api.route("/generate-tf", methods=["POST"])
 def generate_tf():
     """
     Takes a JSON payload with a "message" field (a prompt describing an AWS architecture),
     sends it to the OpenAI Chat Completion API (using the assistant with id ASSISTANT_ID)
     which is configured to return only Terraform (.tf) code.
-    Saves the returned code in a uniquely named .tf file and returns the file as a download.
+    Stores the returned code in the artifact store and returns it as a download; the
+    artifact ID is sent in the X-Artifact-Id header.
+
+    An optional "candidates" field (N > 1) enables speculative generation: N assistant runs
+    are started concurrently, each result is validated locally with terraform validate and
+    TFLint as it arrives, and the first valid candidate is returned while the rest are cancelled.
     """
     data = request.get_json()
     if not data or "message" not in data:
@@ -665,71 +1208,48 @@ def generate_tf():
 
     prompt = data["message"]
 
-    # Send prompt to the API and retrieve response (example code)
-    thread = client.beta.threads.create(messages=[{"role": "user", "content": prompt}])
-    run = client.beta.threads.runs.create(thread_id=thread.id, assistant_id=ASSISTANT_ID)
-
-    while run.status != "completed":
-        time.sleep(1)
-        run = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-
-    message_response = client.beta.threads.messages.list(thread_id=thread.id)
-
-    # Retrieve the assistant message
-    latest_message = message_response.data[0]
-    for msg in message_response.data:
-        if msg.role == "assistant":
-            latest_message = msg
-
-    try:
-        code = latest_message.content[0].text.value
-    except (IndexError, AttributeError):
-        code = latest_message.content[0].text if latest_message.content else ""
+    candidates = data.get("candidates", 1)
+    # bool is a subclass of int, so reject it explicitly along with floats and strings
+    if not isinstance(candidates, int) or isinstance(candidates, bool):
+        return jsonify({"error": "'candidates' must be an integer."}), 400
+    if candidates < 1 or candidates > GENERATE_MAX_CANDIDATES:
+        return jsonify({"error": f"'candidates' must be between 1 and {GENERATE_MAX_CANDIDATES}."}), 400
 
-    code = code.strip()
-    code = clean_code_output(code)
-
-    filename = f"generated_{int(time.time())}.tf"
-    try:
-        with open(filename, "w") as f:
-            f.write(code)
-    except Exception as e:
-        return jsonify({"error": "Failed to write code to file", "details": str(e)}), 500
-
-    # Schedule file deletion after sending the response
-    @after_this_request
-    def remove_file(response):
+    if candidates == 1:
         try:
-            os.remove(filename)
-        except Exception as e:
-            app.logger.error("Error removing file: %s", e)
-        return response
+            code = clean_code_output(send_prompt_to_ai(prompt))
+        except AssistantRunFailed as e:
+            return jsonify({"error": "Assistant run failed.", "details": str(e)}), 502
+    else:
+        code, failures = generate_first_valid_candidate(prompt, candidates)
+        if code is None:
+            return jsonify({"error": "No generated candidate passed validation.", "details": failures}), 422
+
+    artifact_id = artifact_store.put(code)
+    filename = artifact_file_name(artifact_id, "generated")
 
     # Return the file as a download
-    return send_file(filename, as_attachment=True, download_name=filename)
+    return send_artifact(artifact_id, code.encode("utf-8"), filename)
 
 
-@app.route('/get_cost_estimate/<run_id>', methods=['GET'])
+@api.route('/get_cost_estimate/<run_id>', methods=['GET'])
 def get_cost_estimate(run_id):
     try:
         # First API call to get run details
         encoded_run_id = quote(run_id, safe='')
-        run_url = f'https://app.terraform.io/api/v2/runs/{encoded_run_id}'
-        headers = {
-            "Authorization": f"Bearer {HCPT_TOKEN}",
-            "Content-Type": API_CONTENT_TYPE,
-        }
-        run_response = requests.get(run_url, headers=headers)
+        run_url = f'{BASE_URL}/runs/{encoded_run_id}'
+        headers = hcp_headers()
+        run_response = call_upstream("hcp", "run_lookup", "GET", run_url, headers=headers)
         run_response.raise_for_status()
 
         run_data = run_response.json()
 
         # Extract the cost estimate URL
         cost_estimate_path = run_data['data']['relationships']['cost-estimate']['links']['related']
-        cost_estimate_url = f'https://app.terraform.io{cost_estimate_path}'
+        cost_estimate_url = f'{HCPT_ADDRESS}{cost_estimate_path}'
 
         # Second API call to get cost estimate details
-        cost_response = requests.get(cost_estimate_url, headers=headers)
+        cost_response = call_upstream("hcp", "cost_estimate", "GET", cost_estimate_url, headers=headers)
         cost_response.raise_for_status()
 
         cost_data = cost_response.json()
@@ -751,7 +1271,7 @@ def get_cost_estimate(run_id):
 
         return jsonify(result), 200
 
-    except requests.exceptions.HTTPError as http_err:
+    except httpx.HTTPStatusError as http_err:
         return jsonify({'error': f'HTTP error occurred: {http_err}'}), 500
     except KeyError as key_err:
         return jsonify({'error': f'Key error: {key_err}'}), 500
@@ -783,19 +1303,40 @@ def get_tf_contents_from_upload():
 
 
 def fetch_run_status(provided_run_id):
-    """Fetch the Terraform run status using the provided run_id."""
+    """
+    Fetch the Terraform run using the provided run_id.
+    Returns (run_data, None) on success or (None, error dict) on failure.
+    """
     encoded_run_id = quote(provided_run_id, safe='')
     run_url = f"{BASE_URL}/runs/{encoded_run_id}"
-    headers = {
-        "Authorization": f"Bearer {HCPT_TOKEN}",
-        "Content-Type": API_CONTENT_TYPE,
-    }
-    run_resp = requests.get(run_url, headers=headers)
+    run_resp = call_upstream("hcp", "run_lookup", "GET", run_url, headers=hcp_headers())
     if run_resp.status_code != 200:
-        return None, jsonify(
-            {"error": f"Failed to fetch run {provided_run_id} from Terraform.", "details": run_resp.text}
-        ), 400
-    return run_resp.json(), None, None
+        return None, {"error": f"Failed to fetch run {provided_run_id} from Terraform.", "details": run_resp.text}
+    return run_resp.json(), None
+
+
+def fetch_error_output_from_logs(run_id):
+    """Pull the error portion out of a run's apply log, falling back to its plan log."""
+    # Try fetching apply logs first; if missing, try plan logs
+    encoded_run_id = quote(run_id, safe='')
+    apply_url = f"{BASE_URL}/runs/{encoded_run_id}/apply"
+    apply_logs, _ = fetch_log_from_attributes(apply_url)
+    if not apply_logs:
+        plan_url = f"{BASE_URL}/runs/{encoded_run_id}/plan"
+        plan_logs, _ = fetch_log_from_attributes(plan_url)
+        error_output = plan_logs if plan_logs else ""
+    else:
+        error_output = apply_logs
+
+    if not error_output:
+        return "No apply or plan logs available."
+
+    # Extract only the error message portion
+    error_match = re.search(r'(Error:|error:).*', error_output, re.DOTALL)
+    if error_match:
+        print("found error match")
+        error_output = error_match.group(0)
+    return error_output
 
 
 def determine_error_output(provided_run_id, json_payload):
@@ -806,26 +1347,7 @@ def determine_error_output(provided_run_id, json_payload):
     elif "error_output" in request.form and request.form["error_output"].strip():
         error_output = request.form["error_output"]
     elif provided_run_id:
-        # Try fetching apply logs first; if missing, try plan logs
-        encoded_run_id = quote(provided_run_id, safe='')
-        apply_url = f"{BASE_URL}/runs/{encoded_run_id}/apply"
-        apply_logs, _ = fetch_log_from_attributes(apply_url)
-        if not apply_logs:
-            plan_url = f"{BASE_URL}/runs/{encoded_run_id}/plan"
-            plan_logs, _ = fetch_log_from_attributes(plan_url)
-            error_output = plan_logs if plan_logs else ""
-        else:
-            error_output = apply_logs
-
-        if not error_output:
-            error_output = "No apply or plan logs available."
-        else:
-            # Extract only the error message portion
-            error_match = re.search(r'(Error:|error:).*', error_output, re.DOTALL)
-            if error_match:
-                print("found error match")
-                error_output = error_match.group(0)
-    
+        error_output = fetch_error_output_from_logs(provided_run_id)
     else:
         error_output = json_payload.get("error_output", "No error output provided. Please try your best to identify and fix any issues with this code.")
     
@@ -833,15 +1355,37 @@ def determine_error_output(provided_run_id, json_payload):
     return error_output
 
 
-def send_prompt_to_ai(user_prompt):
-    """Send the prompt to the AI assistant and retrieve the fixed Terraform code."""
-    thread = client.beta.threads.create(messages=[{"role": "user", "content": user_prompt}])
-    run_req = client.beta.threads.runs.create(thread_id=thread.id, assistant_id=ASSISTANT_ID)
+class AssistantRunFailed(Exception):
+    """Raised when an assistant run ends in a terminal status other than completed."""
+
+
+def send_prompt_to_ai(user_prompt, cancel_event=None):
+    """
+    Send the prompt to the AI assistant and retrieve the returned Terraform code.
+    If cancel_event is set while the run is in progress, the assistant run is cancelled
+    and None is returned. Raises AssistantRunFailed if the run fails, expires or is
+    cancelled upstream.
+    """
+    client = openai_client.get()
+    with stage("assistant_thread_create", upstream="openai"):
+        thread = client.beta.threads.create(messages=[{"role": "user", "content": user_prompt}])
+    with stage("assistant_run_create", upstream="openai"):
+        run_req = client.beta.threads.runs.create(thread_id=thread.id, assistant_id=ASSISTANT_ID)
     # Poll until the AI run is completed
-    while run_req.status != "completed":
-        time.sleep(1)
-        run_req = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run_req.id)
-    message_response = client.beta.threads.messages.list(thread_id=thread.id)
+    with stage("assistant_run_wait", upstream="openai"):
+        while run_req.status != "completed":
+            if run_req.status in ASSISTANT_RUN_FAILED_STATUSES:
+                raise AssistantRunFailed(f"Assistant run {run_req.id} ended with status {run_req.status}.")
+            if cancel_event is not None and cancel_event.is_set():
+                try:
+                    client.beta.threads.runs.cancel(thread_id=thread.id, run_id=run_req.id)
+                except Exception as e:
+                    print(f"Error cancelling assistant run {run_req.id}: {e}")
+                return None
+            time.sleep(1)
+            run_req = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run_req.id)
+    with stage("assistant_messages", upstream="openai"):
+        message_response = client.beta.threads.messages.list(thread_id=thread.id)
     # Choose the latest assistant message
     latest_message = next((msg for msg in message_response.data if msg.role == "assistant"), message_response.data[0])
     try:
@@ -856,7 +1400,65 @@ def clean_code_output(code):
     match = re.search(r"```(?:\w+)?\n(.*?)```", code, re.DOTALL)
     return match.group(1).strip() if match else code.strip()
 
-@app.route("/fix-errored-run", methods=["POST"])
+
+def generate_candidate(prompt, cancel_event):
+    """Generate one candidate and validate it locally. Returns (code, error dict or None)."""
+    code = send_prompt_to_ai(prompt, cancel_event=cancel_event)
+    if code is None:
+        return None, {"error": "Candidate cancelled."}
+    code = clean_code_output(code)
+    if cancel_event.is_set():
+        return code, {"error": "Candidate cancelled."}
+    return code, validate_tf_code(code)
+
+
+def generate_first_valid_candidate(prompt, candidates):
+    """
+    Race several assistant runs for the same prompt and return the first candidate that
+    passes local validation, cancelling the others. Returns (code, failures); code is None
+    if no candidate validated.
+    """
+    cancel_event = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=candidates)
+    # Run each candidate in a copy of the request context so its stages are attributed to this route
+    futures = [
+        executor.submit(contextvars.copy_context().run, generate_candidate, prompt, cancel_event)
+        for _ in range(candidates)
+    ]
+    failures = []
+    try:
+        for future in as_completed(futures):
+            try:
+                code, error = future.result()
+            except Exception as e:
+                failures.append({"error": str(e)})
+                continue
+            if error is None:
+                return code, failures
+            failures.append(error)
+        return None, failures
+    finally:
+        # Losing candidates notice the event on their next poll and cancel their assistant runs
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def build_fix_prompt(combined_tf_contents, error_output):
+    """Build the prompt asking the AI assistant to fix errored Terraform code."""
+    return (
+        "I have this Terraform configuration that produced an error.\n"
+        "Here is the TF code:\n"
+        "```\n"
+        f"{combined_tf_contents}\n"
+        "```\n"
+        "Here is the error output:\n"
+        "```\n"
+        f"{error_output}\n"
+        "```\n"
+        "Please provide a fixed TF file that addresses the error."
+    )
+
+@api.route("/fix-errored-run", methods=["POST"])
 def fix_errored_run():
     """
     Accepts either:
@@ -871,19 +1473,19 @@ def fix_errored_run():
     # Get TF code from run document or uploaded files
     if provided_run_id:
         try:
-            run_doc = Run.objects.get(run_id=provided_run_id)
-        except DoesNotExist:
-            return jsonify({"error": f"No run found with run_id: {provided_run_id}"}), 404
+            run_doc = get_run_with_tf_files(provided_run_id)
         except Exception as e:
             return jsonify({"error": "Database error", "details": str(e)}), 500
+        if run_doc is None:
+            return jsonify({"error": f"No run found with run_id: {provided_run_id}"}), 404
 
         combined_tf_contents = get_tf_contents_from_run(run_doc)
         if not combined_tf_contents:
             return jsonify({"error": "No .tf files associated with this run."}), 400
 
-        run_data, error_resp, status_code = fetch_run_status(provided_run_id)
-        if error_resp:
-            return error_resp, status_code
+        run_data, error = fetch_run_status(provided_run_id)
+        if error:
+            return jsonify(error), 400
 
         status = run_data["data"]["attributes"]["status"]
         if status != "errored":
@@ -894,50 +1496,246 @@ def fix_errored_run():
             return error_resp, status_code
 
     error_output = determine_error_output(provided_run_id, json_payload)
-    
-    # Build the prompt for the AI assistant
-    user_prompt = (
-        "I have this Terraform configuration that produced an error.\n"
-        "Here is the TF code:\n"
-        "```\n"
-        f"{combined_tf_contents}\n"
-        "```\n"
-        "Here is the error output:\n"
-        "```\n"
-        f"{error_output}\n"
-        "```\n"
-        "Please provide a fixed TF file that addresses the error."
-    )
+    user_prompt = build_fix_prompt(combined_tf_contents, error_output)
 
-    code = send_prompt_to_ai(user_prompt)
+    try:
+        code = send_prompt_to_ai(user_prompt)
+    except AssistantRunFailed as e:
+        return jsonify({"error": "Assistant run failed.", "details": str(e)}), 502
     code = clean_code_output(code)
 
-    fixed_filename = f"fixed_{int(time.time())}.tf"
+    artifact_id = artifact_store.put(code)
+    fixed_filename = artifact_file_name(artifact_id, "fixed")
+
+    return send_artifact(artifact_id, code.encode("utf-8"), fixed_filename)
+
+
+@api.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness check: answers as soon as the worker serves requests, without touching any dependency."""
+    return jsonify({"status": "ok"}), 200
+
+
+@api.route("/readyz", methods=["GET"])
+def readyz():
+    """
+    Readiness check: MongoDB answers a ping, the shared upstream client is built and the
+    HCP Terraform and OpenAI settings are present. Connects to MongoDB on first call;
+    the OpenAI client is still left to be built by the first request that needs it.
+    """
+    checks = {}
     try:
-        with open(fixed_filename, "w") as f:
-            f.write(code)
+        with stage("mongo_ping", upstream="mongo"):
+            mongo.get()
+            import pymongo
+            from mongoengine.connection import get_db
+            # Bounds server selection and the ping itself for this call only
+            with pymongo.timeout(MONGODB_READYZ_TIMEOUT_MS / 1000):
+                get_db().client.admin.command("ping")
+        checks["mongo"] = "ok"
     except Exception as e:
-        return jsonify({"error": "Failed to write fixed TF file to disk.", "details": str(e)}), 500
+        checks["mongo"] = f"error: {e}"
+    checks["upstream"] = "ok" if upstream.http is not None else "error: shared client not started"
+    if HCPT_TOKEN and HCPT_ORG and HCPT_WORKSPACES:
+        checks["hcp"] = "ok"
+    else:
+        checks["hcp"] = "error: missing HCPT_TOKEN, HCPT_ORG or HCPT_WORKSPACE(S)"
+    checks["openai"] = "ok" if OPENAI_API_KEY and ASSISTANT_ID else "error: missing OPENAI_API_KEY or ASSISTANT_ID"
+
+    ready = all(result == "ok" for result in checks.values())
+    return jsonify({"status": "ready" if ready else "not ready", "checks": checks}), 200 if ready else 503
+
+
+@api.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Expose request and per-stage timings in Prometheus text format. Under gunicorn these
+    are summed over every worker through METRICS_MULTIPROC_DIR; otherwise they cover this process.
+    """
+    return metrics.render_latest(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+@api.route("/artifacts/<artifact_id>", methods=["GET"])
+def get_artifact(artifact_id):
+    """Download a previously generated or fixed Terraform file by its artifact ID."""
+    content = artifact_store.get(artifact_id)
+    if content is None:
+        return jsonify({"error": f"No artifact found with artifact_id: {artifact_id}"}), 404
+    return send_artifact(artifact_id, content, artifact_file_name(artifact_id))
+
+
+@api.route("/debug/profiles", methods=["GET"])
+def list_profiles():
+    """List the slow-request profiles kept by the sampling profiler, newest first."""
+    if profiler is None:
+        return jsonify({"error": "Profiling is disabled. Set PROFILE_ENABLED=1 to enable it."}), 404
+    return jsonify({"profiles": profiler.list_dumps()}), 200
+
+
+@api.route("/debug/profiles/<name>", methods=["GET"])
+def get_profile(name):
+    """Download one profile as collapsed stacks (flamegraph.pl / speedscope input)."""
+    if profiler is None:
+        return jsonify({"error": "Profiling is disabled. Set PROFILE_ENABLED=1 to enable it."}), 404
+    if not profiling.PROFILE_NAME_RE.match(name):
+        return jsonify({"error": f"Invalid profile name: {name}"}), 400
+    if not os.path.isfile(os.path.join(profiler.dump_dir, name)):
+        return jsonify({"error": f"No profile found with name: {name}"}), 404
+    return send_from_directory(profiler.dump_dir, name, mimetype="text/plain", as_attachment=True)
+
+def list_errored_run_ids(workspace_id):
+    """Page through the workspace's runs and return the IDs of those in the errored state."""
+    run_ids = []
+    page = 1
+    while page:
+        params = {"filter[status]": "errored", "page[number]": page, "page[size]": 100}
+        resp = call_upstream(
+            "hcp", "list_errored_runs", "GET", f"{BASE_URL}/workspaces/{workspace_id}/runs",
+            headers=hcp_headers(), params=params,
+        )
+        if resp.status_code != 200:
+            raise Exception(f"Failed to fetch errored runs: {resp.text}")
+        body = resp.json()
+        run_ids.extend(run["id"] for run in body.get("data", []))
+        page = body.get("meta", {}).get("pagination", {}).get("next-page")
+    return run_ids
+
+
+def fix_single_errored_run(run_id):
+    """
+    Worker for bulk fixing: looks up the stored run, confirms it errored, pulls the error
+    from its logs and asks the AI assistant for a fix. Upstream calls are gated by the
+    per-upstream semaphores so a large batch can't flood HCP Terraform or OpenAI.
+    Returns a (report_entry, fixed_code) tuple; fixed_code is None unless the run was fixed.
+    """
+    try:
+        run_doc = get_run_with_tf_files(run_id)
+        if run_doc is None:
+            return {"run_id": run_id, "status": "failed", "error": f"No run found with run_id: {run_id}"}, None
+
+        combined_tf_contents = get_tf_contents_from_run(run_doc)
+        if not combined_tf_contents:
+            return {"run_id": run_id, "status": "failed", "error": "No .tf files associated with this run."}, None
 
-    @after_this_request
-    def remove_file(response):
+        with hcpt_semaphore:
+            run_data, error = fetch_run_status(run_id)
+        if error:
+            return {"run_id": run_id, "status": "failed", "error": error["error"]}, None
+
+        status = run_data["data"]["attributes"]["status"]
+        if status != "errored":
+            return {"run_id": run_id, "status": "skipped", "error": f"Run is not in an errored state. Current status: {status}"}, None
+
+        with hcpt_semaphore:
+            error_output = fetch_error_output_from_logs(run_id)
+
+        with openai_semaphore:
+            code = send_prompt_to_ai(build_fix_prompt(combined_tf_contents, error_output))
+        code = clean_code_output(code)
+    except Exception as e:
+        return {"run_id": run_id, "status": "failed", "error": str(e)}, None
+
+    artifact_id = artifact_store.put(code)
+    file_name = artifact_file_name(artifact_id, "fixed")
+    return {"run_id": run_id, "status": "fixed", "file_name": file_name, "artifact_id": artifact_id}, code
+
+
+@api.route("/fix-errored-runs", methods=["POST"])
+def fix_errored_runs():
+    """
+    Bulk version of /fix-errored-run. Accepts an optional JSON payload with a "run_ids" list
+    of at most BULK_FIX_MAX_RUNS runs (400 otherwise). If omitted, the first BULK_FIX_MAX_RUNS
+    errored runs in the workspace pool are fixed and the rest are reported as "deferred", so
+    the caller can resubmit them via "run_ids". Runs are processed on a bounded worker pool
+    and the response is a zip archive containing one fixed .tf file per run plus a
+    report.json with the per-run status.
+    """
+    if not HCPT_TOKEN:
+        return jsonify(MISSING_HCPT_TOKEN_RESPONSE), 500
+
+    json_payload = request.get_json(silent=True) or {}
+    run_ids = json_payload.get("run_ids")
+    workspace_wide = run_ids is None
+    if workspace_wide:
         try:
-            os.remove(fixed_filename)
+            workspace_ids = get_pool_workspace_ids()
+            run_ids = [run_id for workspace_id in workspace_ids.values() for run_id in list_errored_run_ids(workspace_id)]
         except Exception as e:
-            app.logger.error("Error removing file: %s", e)
-        return response
+            return jsonify({"error": str(e)}), 400
+    elif not isinstance(run_ids, list) or not all(isinstance(r, str) and r.strip() for r in run_ids):
+        return jsonify({"error": "'run_ids' must be a list of run ID strings."}), 400
+
+    # Preserve order while dropping duplicates
+    run_ids = list(dict.fromkeys(r.strip() for r in run_ids))
+    if not run_ids:
+        return jsonify({"error": "No errored runs found."}), 404
+    deferred = []
+    if workspace_wide:
+        run_ids, deferred = run_ids[:BULK_FIX_MAX_RUNS], run_ids[BULK_FIX_MAX_RUNS:]
+    elif len(run_ids) > BULK_FIX_MAX_RUNS:
+        # Hand back the full list so the caller can resubmit it in batches via "run_ids"
+        return jsonify({
+            "error": f"{len(run_ids)} runs requested; at most {BULK_FIX_MAX_RUNS} can be fixed per request. "
+                     "Pass a smaller 'run_ids' list.",
+            "run_ids": run_ids,
+        }), 400
+
+    max_workers = min(BULK_FIX_MAX_WORKERS, len(run_ids))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Run each worker in a copy of the request context so its stages are attributed to this route
+        futures = [executor.submit(contextvars.copy_context().run, fix_single_errored_run, run_id) for run_id in run_ids]
+        results = [future.result() for future in futures]
+
+    report = [entry for entry, _ in results]
+    report.extend({"run_id": run_id, "status": "deferred"} for run_id in deferred)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        # Runs fixed to identical code share an artifact, and so a file in the archive
+        written = set()
+        for entry, code in results:
+            if code is not None and entry["file_name"] not in written:
+                zf.writestr(entry["file_name"], code)
+                written.add(entry["file_name"])
+        zf.writestr("report.json", json.dumps({"runs": report}, indent=2))
+    archive.seek(0)
 
     return send_file(
-        fixed_filename,
+        archive,
         as_attachment=True,
-        download_name=fixed_filename,
-        mimetype="text/plain"
+        download_name=f"fixed_runs_{int(time.time())}.zip",
+        mimetype="application/zip"
     )
 
+def create_app():
+    """
+    Build the Flask app and the shared upstream client. The OpenAI client and
+    the MongoDB connection are built lazily on first use. Under a pre-forking server this
+    must run inside each worker after the fork, since none of them is safe to share across processes.
+    """
+    app = Flask(__name__)
+    app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+    CORS(app, resources={r"/*": {"origins": CORS_ORIGINS}}, expose_headers=["X-Artifact-Id", "Server-Timing", "X-Request-Id"])
+    app.register_blueprint(api)
+    metrics.init_app(app)
+    profiling.init_request_ids(app)
+    if profiler is not None:
+        profiler.init_app(app)
+
+    upstream.start()
+    return app
+
+
+def shutdown_app():
+    """Release the per-process clients built since create_app(); called on worker exit."""
+    openai_client.reset()
+    upstream.stop()
+    mongo.reset()
+    metrics.shutdown()
+
+
 if __name__ == "__main__":
     try:
-        connect(host=MONGODB_URI)
-        app.run(debug=True, port=4000)
+        create_app().run(debug=True, port=4000)
     except Exception as e:
         print(e)
 
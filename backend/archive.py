@@ -0,0 +1,171 @@
+import os
+import posixpath
+import stat
+import zlib
+
+ARCHIVE_SUFFIXES = {".tar.gz": "tar", ".tgz": "tar", ".zip": "zip"}
+CHUNK_SIZE = 1024 * 1024
+
+
+class ArchiveError(ValueError):
+    """Raised for archives that are malformed, unsafe to extract or over the size limits."""
+
+
+def archive_format(filename):
+    """Return "tar" or "zip" for a supported archive file name, otherwise None."""
+    lower = (filename or "").lower()
+    for suffix, fmt in ARCHIVE_SUFFIXES.items():
+        if lower.endswith(suffix):
+            return fmt
+    return None
+
+
+def safe_member_path(name):
+    """
+    Normalise an archive member name to a relative POSIX path inside the extraction
+    directory. Absolute paths, drive letters and ".." components are rejected.
+    """
+    if "\x00" in name:
+        raise ArchiveError(f"Invalid path in archive: {name!r}")
+    path = name.replace("\\", "/")
+    if path.startswith("/") or (len(path) > 1 and path[1] == ":"):
+        raise ArchiveError(f"Absolute path in archive: {name}")
+    parts = [part for part in path.split("/") if part not in ("", ".")]
+    if not parts:
+        return None
+    if ".." in parts:
+        raise ArchiveError(f"Path escapes the archive root: {name}")
+    return posixpath.join(*parts)
+
+
+class ExtractionBudget:
+    """Running totals checked against the extracted size and file count limits."""
+
+    def __init__(self, max_bytes, max_files):
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.bytes = 0
+        self.files = 0
+
+    def add_file(self):
+        self.files += 1
+        if self.files > self.max_files:
+            raise ArchiveError(f"Archive contains more than {self.max_files} files.")
+
+    def add_bytes(self, count):
+        self.bytes += count
+        if self.bytes > self.max_bytes:
+            raise ArchiveError(f"Archive expands to more than {self.max_bytes} bytes.")
+
+
+def save_upload(stream, path, max_bytes):
+    """Copy an uploaded file stream to path in chunks, failing once it exceeds max_bytes."""
+    written = 0
+    with open(path, "wb") as out:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_bytes:
+                raise ArchiveError(f"Archive is larger than {max_bytes} bytes.")
+            out.write(chunk)
+    return written
+
+
+def _write_member(src, dest_dir, rel_path, budget):
+    # Sizes in archive headers can lie, so the limit is enforced on the bytes actually read
+    target = os.path.join(dest_dir, rel_path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        out = open(target, "xb")
+    except FileExistsError:
+        raise ArchiveError(f"Duplicate entry in archive: {rel_path}")
+    with out:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            budget.add_bytes(len(chunk))
+            out.write(chunk)
+
+
+def extract_tar_gz(path, dest_dir, max_bytes, max_files):
+    """
+    Extract a .tar.gz in a single streaming pass. Only regular files and directories are
+    allowed; links and device files are rejected. Returns the extracted files' relative paths.
+    """
+    import tarfile
+
+    budget = ExtractionBudget(max_bytes, max_files)
+    extracted = []
+    try:
+        with tarfile.open(path, mode="r|gz") as tar:
+            for member in tar:
+                rel_path = safe_member_path(member.name)
+                if rel_path is None or member.isdir():
+                    continue
+                if not member.isfile():
+                    raise ArchiveError(f"Links and special files are not allowed: {member.name}")
+                budget.add_file()
+                _write_member(tar.extractfile(member), dest_dir, rel_path, budget)
+                extracted.append(rel_path)
+    except (tarfile.TarError, zlib.error, EOFError, OSError) as e:
+        raise ArchiveError(f"Invalid .tar.gz archive: {e}")
+    return extracted
+
+
+def extract_zip(path, dest_dir, max_bytes, max_files):
+    """Extract a .zip with the same rules as extract_tar_gz(). Returns relative paths."""
+    import zipfile
+
+    budget = ExtractionBudget(max_bytes, max_files)
+    extracted = []
+    try:
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                rel_path = safe_member_path(info.filename)
+                if rel_path is None or info.is_dir():
+                    continue
+                if stat.S_ISLNK(info.external_attr >> 16):
+                    raise ArchiveError(f"Links and special files are not allowed: {info.filename}")
+                # zipfile raises RuntimeError for these without a password
+                if info.flag_bits & 0x1:
+                    raise ArchiveError(f"Encrypted files are not supported: {info.filename}")
+                budget.add_file()
+                with zf.open(info) as src:
+                    _write_member(src, dest_dir, rel_path, budget)
+                extracted.append(rel_path)
+    except (zipfile.BadZipFile, NotImplementedError, zlib.error, EOFError, OSError) as e:
+        raise ArchiveError(f"Invalid .zip archive: {e}")
+    return extracted
+
+
+def pack_tar_gz(src_dir, rel_paths, tar_path):
+    """Pack the given files under src_dir into a .tar.gz, keeping their relative paths."""
+    import tarfile
+
+    with tarfile.open(tar_path, "w:gz") as tar:
+        for rel_path in rel_paths:
+            tar.add(os.path.join(src_dir, rel_path), arcname=rel_path)
+
+
+def strip_common_root(rel_paths):
+    """
+    If every path sits under one shared top-level directory, as when a project folder is
+    zipped or tarred as a whole, return that directory and the paths relative to it.
+    Repeats for nested single directories. Returns ("", rel_paths) if there is none.
+    """
+    root = ""
+    while rel_paths and all("/" in p for p in rel_paths):
+        top = rel_paths[0].split("/", 1)[0]
+        if any(p.split("/", 1)[0] != top for p in rel_paths):
+            break
+        root = posixpath.join(root, top)
+        rel_paths = [p.split("/", 1)[1] for p in rel_paths]
+    return root, rel_paths
+
+
+def module_dirs(rel_paths):
+    """Relative directories ("." for the root) that directly contain .tf files, sorted."""
+    return sorted({posixpath.dirname(p) or "." for p in rel_paths if p.endswith(".tf")})
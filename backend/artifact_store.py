@@ -0,0 +1,165 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+def compute_artifact_id(content):
+    """Return the ID an artifact with this content (str or bytes) is stored under."""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def artifact_file_name(artifact_id, kind="artifact"):
+    """
+    Return the file name an artifact is downloaded or uploaded as. Names are derived from
+    the artifact ID alone, so the same content gets the same name whichever route made it.
+    """
+    return f"{kind}_{artifact_id[:12]}.tf"
+
+
+def clear_spill_dir(directory):
+    """Remove the spilled artifacts in a spill directory, e.g. when the server starts."""
+    if not os.path.isdir(directory):
+        return
+    for file_name in os.listdir(directory):
+        if file_name.endswith((".bin", ".tmp")):
+            try:
+                os.remove(os.path.join(directory, file_name))
+            except OSError:
+                pass
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for generated and fixed Terraform files.
+    Artifacts are keyed by the SHA-256 of their content and kept in a bounded in-memory
+    LRU; file names are not stored (see artifact_file_name). When spill_dir is set, every artifact is also written through to it, and reads
+    that miss in memory are served from there. Pointing all worker processes at the same
+    spill_dir lets any of them serve an artifact another one created.
+
+    The spill directory is capped at spill_max_bytes: after every spill_max_bytes / 10
+    bytes written, the least recently put artifacts (by file mtime) are deleted until
+    it fits again.
+    """
+
+    def __init__(self, max_bytes, spill_dir=None, spill_max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self._entries = OrderedDict()  # artifact_id -> content bytes
+        self._size = 0
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._written_since_prune = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            # Trim whatever an earlier server left behind
+            self._prune_spill_dir()
+
+    def put(self, content):
+        """Store content (str or bytes) and return its artifact ID."""
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        artifact_id = compute_artifact_id(content)
+        self._write_through(artifact_id, content)
+        with self._lock:
+            if artifact_id in self._entries:
+                self._entries.move_to_end(artifact_id)
+            else:
+                self._insert(artifact_id, content)
+        return artifact_id
+
+    def get(self, artifact_id):
+        """Return the content bytes of an artifact, or None if it is unknown."""
+        with self._lock:
+            content = self._entries.get(artifact_id)
+            if content is not None:
+                self._entries.move_to_end(artifact_id)
+                return content
+            content = self._load_spilled(artifact_id)
+            if content is not None:
+                self._insert(artifact_id, content)
+            return content
+
+    def _insert(self, artifact_id, content):
+        self._entries[artifact_id] = content
+        self._size += len(content)
+        # Evict least recently used artifacts, always keeping the newest one; with a
+        # spill_dir they are already on disk
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, old_content = self._entries.popitem(last=False)
+            self._size -= len(old_content)
+
+    def _spill_path(self, artifact_id):
+        return os.path.join(self.spill_dir, artifact_id + ".bin")
+
+    def _write_through(self, artifact_id, content):
+        if not self.spill_dir:
+            return
+        data_path = self._spill_path(artifact_id)
+        if os.path.exists(data_path):
+            # Bump its mtime so pruning treats it as recently used
+            try:
+                os.utime(data_path)
+                return
+            except OSError:
+                pass  # pruned in the meantime; write it again
+        # Other threads and processes may write the same artifact at once, so each writes
+        # its own temporary file and renames it into place; a reader never sees a partial file.
+        tmp_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, data_path)
+        except OSError as e:
+            print(f"Error writing artifact {artifact_id} to {self.spill_dir}: {e}")
+            return
+        with self._prune_lock:
+            self._written_since_prune += len(content)
+            if self._written_since_prune < self.spill_max_bytes // 10:
+                return
+            self._written_since_prune = 0
+        self._prune_spill_dir()
+
+    def _prune_spill_dir(self):
+        # Only one thread per process scans at a time; the others skip instead of waiting
+        if not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            spilled = []
+            total = 0
+            with os.scandir(self.spill_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".bin"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    spilled.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            # Oldest first; other processes may be pruning too, so missing files are fine
+            for _, size, path in sorted(spilled):
+                if total <= self.spill_max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+        except OSError as e:
+            print(f"Error pruning artifacts in {self.spill_dir}: {e}")
+        finally:
+            self._prune_lock.release()
+
+    def _load_spilled(self, artifact_id):
+        # Artifact IDs are hex digests; reject anything else before touching the filesystem
+        if not self.spill_dir or len(artifact_id) != 64 or not all(c in "0123456789abcdef" for c in artifact_id):
+            return None
+        try:
+            with open(self._spill_path(artifact_id), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
@@ -0,0 +1,279 @@
+"""
+Local stand-ins for the upstream APIs the backend talks to: HCP Terraform
+(app.terraform.io/api/v2), the GitHub contents API and the OpenAI
+assistants/files/embeddings endpoints. Each fake is a threaded HTTP server with
+configurable per-request latency and error injection, so benchmarks run offline.
+"""
+import base64
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FAKE_TF_CODE = """resource "aws_s3_bucket" "bench" {
+  bucket = "syssavvy-bench"
+}
+"""
+
+
+class FakeServer:
+    """
+    Threaded HTTP server dispatching to (method, path regex, handler) routes.
+    Handlers take (match, query, body) and return (status, body); dict bodies are sent
+    as JSON. Every request waits latency_ms (plus up to jitter_ms) and fails with a 500
+    with probability error_rate.
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.routes = []
+        self.request_count = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def route(self, method, pattern, handler):
+        self.routes.append((method, re.compile(pattern + "$"), handler))
+
+    def next_id(self, prefix):
+        return f"{prefix}-{next(self._ids)}"
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, payload = fake.handle(self.command, self.path, body)
+                if isinstance(payload, (dict, list)):
+                    data = json.dumps(payload).encode()
+                    content_type = "application/json"
+                else:
+                    data = payload.encode() if isinstance(payload, str) else payload
+                    content_type = "text/plain"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, method, raw_path, body):
+        with self._lock:
+            self.request_count += 1
+        delay = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+        if self.error_rate and random.random() < self.error_rate:
+            return 500, {"error": "injected upstream failure"}
+
+        parsed = urlparse(raw_path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        for route_method, pattern, handler in self.routes:
+            if route_method != method:
+                continue
+            match = pattern.match(parsed.path)
+            if match:
+                return handler(match, query, body)
+        return 404, {"error": f"no fake route for {method} {parsed.path}"}
+
+
+class FakeHCPTerraform(FakeServer):
+    """
+    Fake HCP Terraform API; every run it reports is errored, with logs and a cost estimate.
+    The seeded run_ids show up in every workspace. A configuration upload queues a run in
+    the workspace the configuration version belongs to; it reports that configuration
+    version and stays in the workspace's queue (counted as non-final) for queue_seconds.
+    """
+
+    def __init__(self, run_ids=("run-bench",), queue_seconds=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.run_ids = list(run_ids)
+        self.queue_seconds = queue_seconds
+        self.uploaded_runs = {}  # run ID -> (workspace ID, configuration version ID, queued at)
+        self.configuration_versions = {}  # configuration version ID -> workspace ID
+        api = "/api/v2"
+        self.route("GET", api + r"/organizations/([^/]+)/workspaces/([^/]+)", self.get_workspace)
+        self.route("POST", api + r"/workspaces/([^/]+)/configuration-versions", self.create_configuration_version)
+        self.route("PUT", r"/upload/([^/]+)", self.upload_configuration)
+        self.route("GET", api + r"/workspaces/([^/]+)/runs", self.list_runs)
+        self.route("POST", api + r"/runs", lambda m, q, b: (201, {"data": self.run(self.next_id("run"))}))
+        self.route("GET", api + r"/runs/([^/]+)", lambda m, q, b: (200, {"data": self.run(m.group(1))}))
+        self.route("POST", api + r"/runs/([^/]+)/actions/([^/]+)", lambda m, q, b: (200, {}))
+        self.route("GET", api + r"/runs/([^/]+)/(plan|apply)", self.get_log_attributes)
+        self.route("GET", r"/logs/([^/]+)/([^/]+)", self.get_log)
+        self.route("GET", api + r"/cost-estimates/([^/]+)", self.get_cost_estimate)
+
+    def run(self, run_id):
+        relationships = {
+            "cost-estimate": {"links": {"related": f"/api/v2/cost-estimates/ce-{run_id}"}},
+        }
+        if run_id in self.uploaded_runs:
+            workspace_id, cv_id, _ = self.uploaded_runs[run_id]
+            relationships["workspace"] = {"data": {"id": workspace_id, "type": "workspaces"}}
+            relationships["configuration-version"] = {"data": {"id": cv_id, "type": "configuration-versions"}}
+        return {
+            "id": run_id,
+            "type": "runs",
+            "attributes": {"status": "errored", "created-at": "2025-01-01T00:00:00Z", "actions": {}},
+            "relationships": relationships,
+        }
+
+    def get_workspace(self, match, query, body):
+        name = match.group(2)
+        return 200, {"data": {"id": f"ws-{name}", "type": "workspaces", "attributes": {"name": name, "locked": False}}}
+
+    def create_configuration_version(self, match, query, body):
+        cv_id = self.next_id("cv")
+        with self._lock:
+            self.configuration_versions[cv_id] = match.group(1)
+        return 201, {"data": {"id": cv_id, "attributes": {"upload-url": f"{self.url}/upload/{cv_id}"}}}
+
+    def upload_configuration(self, match, query, body):
+        # Uploading a configuration version queues a new run, newest first like the real API
+        cv_id = match.group(1)
+        with self._lock:
+            run_id = self.next_id("run")
+            self.uploaded_runs[run_id] = (self.configuration_versions[cv_id], cv_id, time.monotonic())
+            self.run_ids.insert(0, run_id)
+        return 200, ""
+
+    def list_runs(self, match, query, body):
+        workspace_id = match.group(1)
+        with self._lock:
+            run_ids = [
+                run_id for run_id in self.run_ids
+                if run_id not in self.uploaded_runs or self.uploaded_runs[run_id][0] == workspace_id
+            ]
+        if query.get("filter[status_group]") == "non_final":
+            now = time.monotonic()
+            run_ids = [
+                run_id for run_id in run_ids
+                if run_id in self.uploaded_runs and now - self.uploaded_runs[run_id][2] < self.queue_seconds
+            ]
+        page_size = int(query.get("page[size]", 20))
+        pagination = {"next-page": None, "total-count": len(run_ids)}
+        return 200, {"data": [self.run(run_id) for run_id in run_ids[:page_size]], "meta": {"pagination": pagination}}
+
+    def get_log_attributes(self, match, query, body):
+        run_id, stage = match.groups()
+        return 200, {"data": {"attributes": {"log-read-url": f"{self.url}/logs/{run_id}/{stage}"}}}
+
+    def get_log(self, match, query, body):
+        return 200, f"Terraform {match.group(2)} log\nError: Unsupported argument on main.tf line 2\n"
+
+    def get_cost_estimate(self, match, query, body):
+        resource = {
+            "name": "bench",
+            "type": "aws_s3_bucket",
+            "hourly-cost": "0.01",
+            "prior-monthly-cost": "0.0",
+            "proposed-monthly-cost": "7.3",
+            "delta-monthly-cost": "7.3",
+        }
+        return 200, {"data": {"attributes": {"resources": {"matched": [resource]}}}}
+
+
+class FakeGitHub(FakeServer):
+    """Fake GitHub contents API serving `repos` repos with `examples` complete examples each."""
+
+    EXAMPLE_FILES = ("README.md", "main.tf", "variables.tf", "outputs.tf", "versions.tf")
+
+    def __init__(self, repos=3, examples=2, **kwargs):
+        super().__init__(**kwargs)
+        self.repos = repos
+        self.examples = examples
+        self.route("GET", r"/orgs/([^/]+)/repos", self.list_repos)
+        self.route("GET", r"/repos/([^/]+)/([^/]+)/contents/examples", self.list_examples)
+        self.route("GET", r"/repos/([^/]+)/([^/]+)/contents/examples/([^/]+)", self.list_example_files)
+        self.route("GET", r"/files/([^/]+)/([^/]+)/([^/]+)", self.get_file)
+
+    def list_repos(self, match, query, body):
+        return 200, [{"name": f"terraform-aws-bench{i}"} for i in range(self.repos)]
+
+    def list_examples(self, match, query, body):
+        return 200, [{"type": "dir", "name": f"example{i}"} for i in range(self.examples)]
+
+    def list_example_files(self, match, query, body):
+        _, repo, example = match.groups()
+        return 200, [
+            {
+                "type": "file",
+                "name": name,
+                "url": f"{self.url}/files/{repo}/{example}/{name}",
+                "html_url": f"https://github.com/bench/{repo}/blob/master/examples/{example}/{name}",
+            }
+            for name in self.EXAMPLE_FILES
+        ]
+
+    def get_file(self, match, query, body):
+        repo, example, name = match.groups()
+        content = f"# {repo}/{example}/{name}\n{FAKE_TF_CODE}"
+        return 200, {"encoding": "base64", "content": base64.b64encode(content.encode()).decode()}
+
+
+class FakeOpenAI(FakeServer):
+    """Fake OpenAI API: assistant runs complete on the first poll and reply with a fenced .tf file."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.route("POST", r"/v1/threads", lambda m, q, b: (200, {"id": self.next_id("thread"), "object": "thread"}))
+        self.route("POST", r"/v1/threads/([^/]+)/runs", self.create_run)
+        self.route("GET", r"/v1/threads/([^/]+)/runs/([^/]+)", lambda m, q, b: (200, self.run(m.group(1), m.group(2), "completed")))
+        self.route("POST", r"/v1/threads/([^/]+)/runs/([^/]+)/cancel", lambda m, q, b: (200, self.run(m.group(1), m.group(2), "cancelling")))
+        self.route("GET", r"/v1/threads/([^/]+)/messages", self.list_messages)
+        self.route("POST", r"/v1/files", lambda m, q, b: (200, {"id": self.next_id("file"), "object": "file", "purpose": "assistants"}))
+        self.route("POST", r"/v1/vector_stores/([^/]+)/file_batches", self.create_file_batch)
+        self.route("POST", r"/v1/embeddings", self.create_embedding)
+
+    def run(self, thread_id, run_id, status):
+        return {"id": run_id, "object": "thread.run", "thread_id": thread_id, "status": status}
+
+    def create_run(self, match, query, body):
+        return 200, self.run(match.group(1), self.next_id("run"), "queued")
+
+    def list_messages(self, match, query, body):
+        message = {
+            "id": self.next_id("msg"),
+            "object": "thread.message",
+            "thread_id": match.group(1),
+            "role": "assistant",
+            "content": [{"type": "text", "text": {"value": f"```hcl\n{FAKE_TF_CODE}```", "annotations": []}}],
+        }
+        return 200, {"object": "list", "data": [message]}
+
+    def create_file_batch(self, match, query, body):
+        return 200, {"id": self.next_id("vsfb"), "object": "vector_store.files_batch",
+                     "vector_store_id": match.group(1), "status": "in_progress"}
+
+    def create_embedding(self, match, query, body):
+        return 200, {"object": "list", "model": "text-embedding-ada-002",
+                     "data": [{"object": "embedding", "index": 0, "embedding": [0.0] * 1536}]}
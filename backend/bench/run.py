@@ -0,0 +1,207 @@
+"""
+End-to-end latency benchmark for the backend, fully offline.
+
+Runs the real Flask app (create_app) on a local threaded server against the fakes in
+bench/fakes.py, an in-memory mongomock database and the stub terraform/tflint
+binaries in bench/bin, then drives each route with a closed-loop load generator and
+reports p50/p95/p99 latency and throughput. From the backend directory:
+
+    pip install -r requirements.txt -r bench/requirements.txt
+    python -m bench.run --concurrency 16 --requests 200 --latency-ms 50
+
+Note that /upload-terraform includes at least one HCPT_RUN_POLL_INTERVAL wait for the
+run to be triggered, and /generate-tf and /fix-errored-run include one assistant poll
+interval. --workspaces spreads uploads over a pool of fake workspaces; --queue-seconds
+makes each uploaded run count towards its workspace's queue depth for that long.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from bench.fakes import FAKE_TF_CODE, FakeGitHub, FakeHCPTerraform, FakeOpenAI
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROUTES = ("upload-terraform", "runs", "store-readmes", "generate-tf", "fix-errored-run")
+SEEDED_RUN_IDS = [f"run-seed-{i}" for i in range(10)]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def build_requests(base_url):
+    """Map each benchmarked route to a function sending one request with a given session."""
+    seeded = itertools.count()
+
+    def upload(session):
+        files = {"tf_files": ("main.tf", FAKE_TF_CODE, "text/plain")}
+        return session.post(f"{base_url}/upload-terraform", files=files)
+
+    def fix(session):
+        run_id = SEEDED_RUN_IDS[next(seeded) % len(SEEDED_RUN_IDS)]
+        return session.post(f"{base_url}/fix-errored-run", json={"run_id": run_id})
+
+    return {
+        "upload-terraform": upload,
+        "runs": lambda session: session.get(f"{base_url}/runs"),
+        "store-readmes": lambda session: session.post(f"{base_url}/store-readmes"),
+        "generate-tf": lambda session: session.post(f"{base_url}/generate-tf", json={"message": "An S3 bucket"}),
+        "fix-errored-run": fix,
+    }
+
+
+def run_load(send, total, concurrency):
+    """Issue `total` requests from `concurrency` closed-loop workers and collect latencies."""
+    latencies = []
+    statuses = {}
+    remaining = [total]
+    lock = threading.Lock()
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                status = send(session).status_code
+            except requests.RequestException:
+                status = "exception"
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(min(concurrency, total))]
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if status == "exception" or status >= 400)
+    return {
+        "requests": total,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_rps": total / wall if wall else 0.0,
+    }
+
+
+def start_app(hcp, github, openai_fake, workspaces=1):
+    """Point the app at the fakes, build it with create_app() and serve it on a local port."""
+    os.environ.update({
+        "HCPT_ADDRESS": hcp.url,
+        "HCPT_TOKEN": "bench-token",
+        "HCPT_ORG": "bench-org",
+        "HCPT_WORKSPACES": ",".join(f"bench-workspace-{i}" for i in range(workspaces)),
+        "GITHUB_API_URL": github.url,
+        "OPENAI_BASE_URL": f"{openai_fake.url}/v1",
+        "OPENAI_API_KEY": "bench-key",
+        "ASSISTANT_ID": "asst-bench",
+        "VECTOR_STORE_ID": "vs-bench",
+        # Never dialled: the connection is replaced with mongomock below
+        "MONGODB_URI": "mongodb://127.0.0.1:1/bench",
+        "PATH": os.path.join(BENCH_DIR, "bin") + os.pathsep + os.environ.get("PATH", ""),
+    })
+
+    import mongomock
+    from mongoengine import connect, disconnect
+    from werkzeug.serving import make_server
+
+    import app as backend
+    from schemas.runModel import Run, TerraformFile
+
+    flask_app = backend.create_app()
+    # Build the app's lazy connection, then swap it for mongomock under the same alias
+    backend.mongo.get()
+    disconnect()
+    connect("bench", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+    for run_id in SEEDED_RUN_IDS:
+        Run(
+            run_id=run_id,
+            tf_files=[TerraformFile(file_name="main.tf", file_content=FAKE_TF_CODE)],
+            workspace_id="ws-bench-workspace-0",
+            organization_name="bench-org",
+        ).save()
+
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end latency benchmark for the backend.")
+    parser.add_argument("--routes", nargs="+", choices=ROUTES, default=list(ROUTES))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=40, help="requests per route")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="latency added by every fake upstream call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability a fake upstream call returns 500")
+    parser.add_argument("--tool-delay", type=float, default=0.0, help="seconds each stub terraform/tflint call takes")
+    parser.add_argument("--workspaces", type=int, default=1, help="size of the HCP Terraform workspace pool")
+    parser.add_argument("--queue-seconds", type=float, default=0.0,
+                        help="how long an uploaded run counts towards its workspace's queue depth")
+    parser.add_argument("--github-repos", type=int, default=3)
+    parser.add_argument("--github-examples", type=int, default=2)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output and request log")
+    args = parser.parse_args(argv)
+
+    report = sys.stdout
+    if not args.verbose:
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    upstream_options = {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate}
+    hcp = FakeHCPTerraform(run_ids=SEEDED_RUN_IDS, queue_seconds=args.queue_seconds, **upstream_options).start()
+    github = FakeGitHub(repos=args.github_repos, examples=args.github_examples, **upstream_options).start()
+    openai_fake = FakeOpenAI(**upstream_options).start()
+    os.environ["BENCH_TOOL_DELAY"] = str(args.tool_delay)
+
+    # store-readmes packs the examples it ingests into examples_pack/ under the working directory
+    os.chdir(tempfile.mkdtemp(prefix="syssavvy-bench-"))
+    server, base_url = start_app(hcp, github, openai_fake, workspaces=args.workspaces)
+    senders = build_requests(base_url)
+
+    results = {}
+    app_output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    try:
+        with app_output:
+            for route in args.routes:
+                results[route] = run_load(senders[route], args.requests, args.concurrency)
+                if not args.json:
+                    r = results[route]
+                    print(f"{route:<18} n={r['requests']:<5} errors={r['errors']:<4} "
+                          f"p50={r['p50_ms']:8.1f}ms p95={r['p95_ms']:8.1f}ms p99={r['p99_ms']:8.1f}ms "
+                          f"throughput={r['throughput_rps']:7.1f} req/s", file=report, flush=True)
+    finally:
+        server.shutdown()
+        for fake in (hcp, github, openai_fake):
+            fake.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2), file=report)
+
+
+if __name__ == "__main__":
+    main()
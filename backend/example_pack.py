@@ -0,0 +1,177 @@
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; appends are then only serialised in-process
+    fcntl = None
+
+# Sections of an example, in the order they are appended (and combined for the vector store)
+SECTIONS = ("readme", "variables", "versions", "main", "outputs")
+
+INDEX_MAGIC = b"SSXIDX1\n"
+# section id, repo name length, example name length, data offset, data length
+INDEX_RECORD = struct.Struct("<BHHQI")
+# Data length recorded for a section the latest ingest of an example didn't have
+ABSENT = 0xFFFFFFFF
+DATA_FILE = "examples.pack"
+INDEX_FILE = "examples.idx"
+
+
+class ExamplePack:
+    """
+    Packed corpus of Terraform examples: one append-only data file holding the UTF-8
+    text of every section, plus an append-only index of
+    (repo, example, section) -> (offset, length) records.
+
+    The index is held in memory as a dict, so fetching an example is O(1). Section text is
+    returned as memoryview slices of an mmap of the data file, without copying. An
+    example's sections are appended contiguously, so iter_examples() reads the corpus in
+    one sequential pass over the data file. Re-ingesting an example with changed sections
+    appends new data and the latest index record wins; re-ingesting it unchanged writes
+    nothing, so repeated ingests of the same corpus don't grow the pack. Other processes' appends are picked up by re-reading the
+    index from where this process last stopped.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.data_path = os.path.join(directory, DATA_FILE)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self._entries = {}  # (repo, example) -> [(offset, length) or None per section]
+        self._repos = {}  # repo -> {example: None}, in first-ingested order
+        self._index_read = 0
+        self._map = None
+        self._view = None
+        self._lock = threading.Lock()
+
+    # ---- writing ----
+
+    def append(self, repo, example, sections):
+        """
+        Append an example's sections (a dict of section name -> str) to the pack. Returns
+        False without writing anything if the pack already holds exactly these sections.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(self.index_path, "ab") as index, open(self.data_path, "ab") as data:
+            if fcntl is not None:
+                fcntl.flock(index.fileno(), fcntl.LOCK_EX)
+            try:
+                encoded_sections = [
+                    None if sections.get(name) is None else sections[name].encode("utf-8") for name in SECTIONS
+                ]
+                # Compare against the latest version, including other processes' appends
+                self._refresh()
+                if self._matches(self._entries.get((repo, example)), encoded_sections):
+                    return False
+                # Another process may have appended between open() and taking the lock
+                index.seek(0, os.SEEK_END)
+                data.seek(0, os.SEEK_END)
+                if index.tell() == 0:
+                    index.write(INDEX_MAGIC)
+                offset = data.tell()
+                records = []
+                for section_id, encoded in enumerate(encoded_sections):
+                    if encoded is None:
+                        records.append((section_id, offset, ABSENT))
+                        continue
+                    data.write(encoded)
+                    records.append((section_id, offset, len(encoded)))
+                    offset += len(encoded)
+                # Data goes out before the index records that point at it
+                data.flush()
+                repo_bytes, example_bytes = repo.encode("utf-8"), example.encode("utf-8")
+                for section_id, section_offset, length in records:
+                    index.write(INDEX_RECORD.pack(section_id, len(repo_bytes), len(example_bytes), section_offset, length))
+                    index.write(repo_bytes + example_bytes)
+                index.flush()
+                return True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(index.fileno(), fcntl.LOCK_UN)
+
+    def _matches(self, entry, encoded_sections):
+        if entry is None:
+            return False
+        for location, encoded in zip(entry, encoded_sections):
+            if (location is None) != (encoded is None):
+                return False
+            if location is not None and (location[1] != len(encoded) or self._slice(*location) != encoded):
+                return False
+        return True
+
+    # ---- reading ----
+
+    def _refresh(self):
+        # Parse index records appended since the last call, by this or any other process
+        try:
+            size = os.path.getsize(self.index_path)
+        except OSError:
+            return
+        if size <= self._index_read:
+            return
+        with open(self.index_path, "rb") as index:
+            index.seek(self._index_read)
+            buf = index.read(size - self._index_read)
+        pos = 0
+        if self._index_read == 0:
+            if not buf.startswith(INDEX_MAGIC):
+                raise ValueError(f"{self.index_path} is not an example pack index")
+            pos = len(INDEX_MAGIC)
+        while pos + INDEX_RECORD.size <= len(buf):
+            section_id, repo_len, example_len, offset, length = INDEX_RECORD.unpack_from(buf, pos)
+            end = pos + INDEX_RECORD.size + repo_len + example_len
+            if end > len(buf):
+                break  # record still being written
+            names = buf[pos + INDEX_RECORD.size:end]
+            key = (names[:repo_len].decode("utf-8"), names[repo_len:].decode("utf-8"))
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [None] * len(SECTIONS)
+                self._repos.setdefault(key[0], {})[key[1]] = None
+            entry[section_id] = None if length == ABSENT else (offset, length)
+            pos = end
+        self._index_read += pos
+
+    def _slice(self, offset, length):
+        if length == 0:
+            return memoryview(b"")
+        if self._view is None or offset + length > len(self._view):
+            # The data file grew since it was mapped; earlier views keep the old map alive
+            with open(self.data_path, "rb") as data:
+                self._map = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+        return self._view[offset:offset + length]
+
+    def _sections(self, entry):
+        return {
+            SECTIONS[section_id]: self._slice(*location)
+            for section_id, location in enumerate(entry)
+            if location is not None
+        }
+
+    def sections(self, repo, example):
+        """Sections of one example as {name: memoryview}, or None if it isn't in the pack."""
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get((repo, example))
+            if entry is None:
+                return None
+            return self._sections(entry)
+
+    def iter_examples(self, repo=None):
+        """
+        Yield (repo, example, sections) for every example, optionally only those of one
+        repo, in data-file order. The index is read once for the whole pass.
+        """
+        with self._lock:
+            self._refresh()
+            if repo is not None:
+                keys = [(repo, example) for example in self._repos.get(repo, ())]
+            else:
+                keys = list(self._entries)
+            # Order by where each example's latest sections start in the data file
+            keys.sort(key=lambda key: min((location[0] for location in self._entries[key] if location), default=0))
+            examples = [(r, example, self._sections(self._entries[(r, example)])) for r, example in keys]
+        yield from examples
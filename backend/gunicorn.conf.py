@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+import tempfile
+
+# Serve the app factory from wsgi.py with several worker processes, each running a
+# pool of threads. The app is not preloaded, so create_app() runs in every worker
+# after the fork.
+wsgi_app = "wsgi:app"
+bind = os.getenv("BIND", "0.0.0.0:4000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+# Almost every route spends its time blocked on HCP Terraform, GitHub or OpenAI, and a
+# blocked thread costs little besides its stack. So each worker gets a thread per
+# concurrent upstream call it should hold, sized to match the shared client's
+# connection pool (UPSTREAM_MAX_CONNECTIONS).
+threads = int(os.getenv("WEB_THREADS", "200"))
+preload_app = False
+
+# Workers only see each other's generated/fixed artifacts through the shared spill
+# directory, so always give them one. Set ARTIFACT_SPILL_DIR explicitly to a volume
+# shared by every host when running more than one; the default one in /tmp is private
+# to this server and is cleared when it starts. Either way ARTIFACT_SPILL_MAX_BYTES caps it.
+DEFAULT_SPILL_DIR = "ARTIFACT_SPILL_DIR" not in os.environ
+os.environ.setdefault("ARTIFACT_SPILL_DIR", os.path.join(tempfile.gettempdir(), "syssavvy-artifacts"))
+# Workers share their metrics through snapshot files in this directory, so /metrics
+# reports server-wide totals whichever worker answers the scrape
+os.environ.setdefault("METRICS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), f"syssavvy-metrics-{os.getpid()}"))
+
+# Assistant runs and Terraform validation can take minutes
+timeout = int(os.getenv("WEB_TIMEOUT", "300"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "60"))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    # Counters start from zero with each server; drop snapshots left by an earlier one
+    from metrics import clear_multiprocess_dir
+
+    clear_multiprocess_dir(os.environ["METRICS_MULTIPROC_DIR"])
+
+    # Artifacts in the default spill directory are not kept across restarts
+    if DEFAULT_SPILL_DIR:
+        from artifact_store import clear_spill_dir
+
+        clear_spill_dir(os.environ["ARTIFACT_SPILL_DIR"])
+
+
+def on_exit(server):
+    from metrics import clear_multiprocess_dir
+
+    directory = os.environ["METRICS_MULTIPROC_DIR"]
+    clear_multiprocess_dir(directory)
+    try:
+        os.rmdir(directory)
+    except OSError:
+        pass
+
+
+def worker_exit(server, worker):
+    # Close the worker's Mongo connection and HTTP client once in-flight requests finish,
+    # and write out its final metrics snapshot
+    from app import shutdown_app
+
+    shutdown_app()
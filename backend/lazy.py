@@ -0,0 +1,38 @@
+import threading
+
+
+class Lazy:
+    """
+    Thread-safe lazy singleton. The factory runs once, on the first get(), so heavy
+    imports and client construction are only paid for by processes that use them.
+    reset() closes the built value (if a close function was given) so the next get()
+    builds a fresh one, e.g. in a new worker process.
+    """
+
+    def __init__(self, factory, close=None):
+        self._factory = factory
+        self._close = close
+        self._value = None
+        self._built = False
+        self._lock = threading.Lock()
+
+    @property
+    def built(self):
+        return self._built
+
+    def get(self):
+        if self._built:
+            return self._value
+        with self._lock:
+            if not self._built:
+                self._value = self._factory()
+                self._built = True
+        return self._value
+
+    def reset(self):
+        with self._lock:
+            if not self._built:
+                return
+            value, self._value, self._built = self._value, None, False
+        if self._close is not None:
+            self._close(value)
@@ -0,0 +1,308 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Most Server-Timing entries sent per response (besides "total"), to keep the header small
+SERVER_TIMING_MAX_ENTRIES = 20
+SNAPSHOT_PREFIX = "metrics_"
+
+# Set whenever a metric changes, so idle processes don't rewrite their snapshot
+_changed = threading.Event()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter keyed by label values."""
+
+    def __init__(self, name, documentation, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+        _changed.set()
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(label_values), value] for label_values, value in self._values.items()]
+
+    @staticmethod
+    def combine(a, b):
+        return a + b
+
+    def expose(self, values=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values) if values is None else values
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values."""
+
+    def __init__(self, name, documentation, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+        _changed.set()
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(label_values), list(series)] for label_values, series in self._values.items()]
+
+    @staticmethod
+    def combine(a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    def expose(self, values=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = {k: list(v) for k, v in self._values.items()} if values is None else values
+        for label_values, series in sorted(values.items()):
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(self.label_names, label_values, [("le", repr(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.label_names, label_values, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    "syssavvy_request_duration_seconds", "Time spent handling HTTP requests.", ("route", "method", "status"))
+REQUESTS_TOTAL = Counter(
+    "syssavvy_requests_total", "HTTP requests handled.", ("route", "method", "status"))
+STAGE_DURATION = Histogram(
+    "syssavvy_stage_duration_seconds", "Time spent in each stage of a request.", ("route", "stage", "upstream", "status"))
+STAGES_TOTAL = Counter(
+    "syssavvy_stages_total", "Stages executed.", ("route", "stage", "upstream", "status"))
+
+REGISTRY = (REQUEST_DURATION, REQUESTS_TOTAL, STAGE_DURATION, STAGES_TOTAL)
+
+
+class MultiprocessStore:
+    """
+    Shares metrics between the worker processes of one server through a directory. Each
+    process rewrites a snapshot of its own metrics to a file of its own every interval
+    (and on exit); rendering sums the snapshots of every process that ever wrote one. So
+    counters only grow across scrapes whichever worker answers, and the totals of exited
+    workers are kept. Files are named by pid plus a random suffix, so a recycled pid never
+    overwrites an earlier worker's totals.
+    """
+
+    def __init__(self, directory, interval):
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(directory, f"{SNAPSHOT_PREFIX}{os.getpid()}_{uuid.uuid4().hex[:8]}.json")
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if _changed.is_set():
+                self.flush()
+
+    def flush(self):
+        """Write this process's current metrics to its snapshot file."""
+        with self._lock:
+            _changed.clear()
+            snapshot = {metric.name: metric.snapshot() for metric in REGISTRY}
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f)
+                # Readers only ever see complete snapshots
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Error writing metrics snapshot {self.path}: {e}")
+
+    def collect(self):
+        """Sum the snapshots of every process into {metric name: {label values: value}}."""
+        merged = {metric.name: {} for metric in REGISTRY}
+        combiners = {metric.name: metric.combine for metric in REGISTRY}
+        for file_name in os.listdir(self.directory):
+            if not (file_name.startswith(SNAPSHOT_PREFIX) and file_name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, file_name), encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # removed or unreadable; skip this scrape
+            for name, series in snapshot.items():
+                values = merged.get(name)
+                if values is None:
+                    continue
+                for label_values, value in series:
+                    key = tuple(label_values)
+                    values[key] = combiners[name](values[key], value) if key in values else value
+        return merged
+
+
+def clear_multiprocess_dir(directory):
+    """Remove the snapshot files in a multiprocess metrics directory, e.g. when the server starts."""
+    if not os.path.isdir(directory):
+        return
+    for file_name in os.listdir(directory):
+        if file_name.startswith(SNAPSHOT_PREFIX):
+            try:
+                os.remove(os.path.join(directory, file_name))
+            except OSError:
+                pass
+
+
+_store = None
+
+
+def current_route():
+    """Route template of the request being handled, or "background" outside a request."""
+    if not has_request_context():
+        return "background"
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+class StageTimer:
+    """Handle yielded by stage(); set .status to record an upstream status code."""
+
+    def __init__(self):
+        self.status = "ok"
+
+
+@contextmanager
+def stage(name, upstream="none"):
+    """
+    Time a block as one stage of the current request. The duration is recorded in the
+    stage histogram and, inside a request, added to that request's Server-Timing header.
+    """
+    timer = StageTimer()
+    start = time.perf_counter()
+    try:
+        yield timer
+    except BaseException:
+        timer.status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        route = current_route()
+        status = str(timer.status)
+        STAGE_DURATION.observe(elapsed, route, name, upstream, status)
+        STAGES_TOTAL.inc(route, name, upstream, status)
+        if has_request_context():
+            # Repeated stages are summed, so the header stays bounded however often they run
+            totals = g.setdefault("stage_timings", {}).setdefault((name, upstream), [0.0, 0])
+            totals[0] += elapsed
+            totals[1] += 1
+
+
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+def _record_request(response):
+    start = g.get("request_start")
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    route = current_route()
+    status = str(response.status_code)
+    REQUEST_DURATION.observe(elapsed, route, request.method, status)
+    REQUESTS_TOTAL.inc(route, request.method, status)
+
+    response.headers["Server-Timing"] = server_timing(g.get("stage_timings", {}), elapsed)
+    return response
+
+
+def server_timing(stage_timings, elapsed):
+    """
+    Build a Server-Timing header value. A stage run several times (once per repo, per
+    file...) gets one entry with its summed duration and call count, and only the
+    SERVER_TIMING_MAX_ENTRIES slowest stages are listed, in the order they first ran.
+    """
+    slowest = sorted(stage_timings.items(), key=lambda item: item[1][0], reverse=True)[:SERVER_TIMING_MAX_ENTRIES]
+    kept = {key for key, _ in slowest}
+    entries = []
+    for (name, upstream), (duration, count) in stage_timings.items():
+        if (name, upstream) not in kept:
+            continue
+        details = ([upstream] if upstream != "none" else []) + ([f"{count} calls"] if count > 1 else [])
+        description = f';desc="{", ".join(details)}"' if details else ""
+        entries.append(f"{name};dur={duration * 1000:.1f}{description}")
+    entries.append(f"total;dur={elapsed * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def init_app(app):
+    """
+    Register the per-request timing hooks on the Flask app. When METRICS_MULTIPROC_DIR is
+    set, this process also starts sharing its metrics through that directory.
+    """
+    global _store
+    app.before_request(_start_request_timer)
+    app.after_request(_record_request)
+    directory = os.getenv("METRICS_MULTIPROC_DIR")
+    if directory and _store is None:
+        _store = MultiprocessStore(directory, float(os.getenv("METRICS_FLUSH_INTERVAL", "1")))
+        _store.start()
+
+
+def shutdown():
+    """Write this process's final snapshot so an exiting worker's last requests are counted."""
+    if _store is not None:
+        _store.flush()
+
+
+def render_latest():
+    """Render every metric in the Prometheus text exposition format, summed over all workers if shared."""
+    lines = []
+    if _store is None:
+        for metric in REGISTRY:
+            lines.extend(metric.expose())
+    else:
+        _store.flush()
+        merged = _store.collect()
+        for metric in REGISTRY:
+            lines.extend(metric.expose(merged[metric.name]))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,190 @@
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import g, request
+
+PROFILE_SUFFIX = ".folded"
+# <unix ms>_<request id>_<duration>ms_<route slug>.folded
+PROFILE_NAME_RE = re.compile(r"^(\d+)_([0-9A-Za-z-]+)_(\d+)ms_([0-9A-Za-z_.-]*)\.folded$")
+REQUEST_ID_RE = re.compile(r"^[0-9A-Za-z-]{1,64}$")
+SKIPPED_ROUTES = ("/healthz", "/readyz", "/metrics", "/debug/profiles", "/debug/profiles/<name>")
+
+
+class ProfileSession:
+    """Stack samples collected for one request, across the threads that serve it."""
+
+    def __init__(self):
+        self.thread_ids = set()
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+
+    def attach_current_thread(self):
+        self.thread_ids.add(threading.get_ident())
+
+
+def collapse_stack(frame):
+    """Render a frame and its callers as one collapsed-stack line, outermost call first."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for sampled requests. A single background thread wakes every
+    interval while any session is active and records the current stack of each thread
+    attached to a session. Requests slower than the threshold are written as collapsed
+    stacks (flamegraph.pl / speedscope format) into a bounded ring of files.
+    """
+
+    def __init__(self, sample_rate, threshold_ms, interval_ms, dump_dir, max_dumps):
+        self.sample_rate = sample_rate
+        self.threshold_ms = threshold_ms
+        self.interval = interval_ms / 1000
+        self.dump_dir = dump_dir
+        self.max_dumps = max_dumps
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+
+    def start_session(self):
+        session = ProfileSession()
+        session.attach_current_thread()
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+        return session
+
+    def stop_session(self, session):
+        with self._lock:
+            self._sessions.discard(session)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._sessions:
+                    self._wakeup.wait()
+                sessions = list(self._sessions)
+            frames = sys._current_frames()
+            for session in sessions:
+                for thread_id in list(session.thread_ids):
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        session.stacks[collapse_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def write_dump(self, session, route, request_id, duration_ms):
+        """Write the session's samples to the ring directory and drop the oldest dumps."""
+        os.makedirs(self.dump_dir, exist_ok=True)
+        route_slug = re.sub(r"[^0-9A-Za-z_.-]+", "_", route).strip("_")
+        name = f"{int(time.time() * 1000)}_{request_id}_{int(duration_ms)}ms_{route_slug}{PROFILE_SUFFIX}"
+        lines = [f"{stack} {count}" for stack, count in session.stacks.most_common()]
+        with open(os.path.join(self.dump_dir, name), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        dumps = sorted(n for n in os.listdir(self.dump_dir) if PROFILE_NAME_RE.match(n))
+        for old_name in dumps[:-self.max_dumps] if self.max_dumps > 0 else dumps:
+            try:
+                os.remove(os.path.join(self.dump_dir, old_name))
+            except OSError:
+                pass
+        return name
+
+    def list_dumps(self):
+        """Describe the dumps currently in the ring, newest first."""
+        if not os.path.isdir(self.dump_dir):
+            return []
+        dumps = []
+        for name in sorted(os.listdir(self.dump_dir), reverse=True):
+            match = PROFILE_NAME_RE.match(name)
+            if not match:
+                continue
+            created_ms, request_id, duration_ms, route_slug = match.groups()
+            dumps.append({
+                "name": name,
+                "request_id": request_id,
+                "route": route_slug,
+                "duration_ms": int(duration_ms),
+                "created_at": int(created_ms) / 1000,
+                "size": os.path.getsize(os.path.join(self.dump_dir, name)),
+            })
+        return dumps
+
+    # ---- Flask integration ----
+
+    def _before_request(self):
+        if request.url_rule is None or request.url_rule.rule in SKIPPED_ROUTES:
+            return
+        if random.random() < self.sample_rate:
+            g.profile_session = self.start_session()
+
+    def _after_request(self, response):
+        session = g.pop("profile_session", None)
+        if session is None:
+            return response
+        self.stop_session(session)
+        duration_ms = (time.perf_counter() - session.started) * 1000
+        if duration_ms >= self.threshold_ms and session.stacks:
+            request_id = g.get("request_id") or uuid.uuid4().hex
+            try:
+                self.write_dump(session, request.url_rule.rule, request_id, duration_ms)
+            except OSError as e:
+                print(f"Error writing profile for request {request_id}: {e}")
+        return response
+
+    def _teardown_request(self, exc):
+        # after_request is skipped on unhandled errors; make sure sampling stops anyway
+        session = g.pop("profile_session", None)
+        if session is not None:
+            self.stop_session(session)
+
+    def init_app(self, app):
+        """Register the sampling hooks; call after init_request_ids() so dumps carry the request ID."""
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+
+def _assign_request_id():
+    # Request IDs end up in profile file names, so only accept caller-supplied ones that are safe there
+    supplied = request.headers.get("X-Request-Id", "")
+    g.request_id = supplied if REQUEST_ID_RE.match(supplied) else uuid.uuid4().hex
+
+
+def _send_request_id(response):
+    response.headers["X-Request-Id"] = g.get("request_id", "")
+    return response
+
+
+def init_request_ids(app):
+    """Give every request an X-Request-Id (the caller's, if valid) and echo it on the response."""
+    app.before_request(_assign_request_id)
+    app.after_request(_send_request_id)
+
+
+def profiler_from_env():
+    """Build a SamplingProfiler from PROFILE_* environment variables, or None when disabled."""
+    if os.getenv("PROFILE_ENABLED", "").lower() not in ("1", "true", "yes"):
+        return None
+    return SamplingProfiler(
+        sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "1.0")),
+        threshold_ms=float(os.getenv("PROFILE_THRESHOLD_MS", "1000")),
+        interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+        dump_dir=os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "syssavvy-profiles")),
+        max_dumps=int(os.getenv("PROFILE_MAX_DUMPS", "50")),
+    )
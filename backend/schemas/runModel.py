@@ -1,4 +1,6 @@
-from mongoengine import Document, EmbeddedDocument, StringField, ListField, EmbeddedDocumentField
+from datetime import datetime, timezone
+
+from mongoengine import Document, EmbeddedDocument, StringField, ListField, EmbeddedDocumentField, DateTimeField
 
 # Define the structure for each Terraform file
 class TerraformFile(EmbeddedDocument):
@@ -10,5 +12,20 @@ class Run(Document):
     run_id = StringField(required=True)
     tf_files = ListField(EmbeddedDocumentField(TerraformFile), required=True)
     workspace_id = StringField(required=True)
+    # Name of the pool workspace the run was scheduled on; unset for runs stored before the pool
+    workspace_name = StringField()
     organization_name = StringField(required=True)
+    created_at = DateTimeField(default=lambda: datetime.now(timezone.utc))
+
+    meta = {
+        "indexes": [
+            {"fields": ["run_id"], "unique": True},
+            # run_id breaks created_at ties in /run-history's cursor paging
+            ("workspace_id", "-created_at", "-run_id"),
+            ("organization_name", "-created_at", "-run_id"),
+            ("-created_at", "-run_id"),
+        ]
+    }
 
+# Fields returned for metadata-only reads; leaves out the Terraform file bodies
+RUN_METADATA_FIELDS = ("run_id", "workspace_id", "workspace_name", "organization_name", "created_at", "tf_files.file_name")
@@ -0,0 +1,42 @@
+import threading
+
+import httpx
+
+
+class Upstream:
+    """
+    Shared HTTP client for calls to HCP Terraform and OpenAI.
+
+    One pooled httpx.Client per process: it is thread-safe, so every request thread of a
+    gthread worker sends through it and reuses its keep-alive connections instead of
+    opening new ones per call. Concurrency comes from the worker's thread pool; a request
+    thread waiting on a slow upstream only costs an idle thread and a pooled connection.
+    Each process must call start() after forking, since connections can't be shared
+    across a fork.
+    """
+
+    def __init__(self, max_connections=200, timeout=60.0):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.http = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Build the shared client. Safe to call twice."""
+        with self._lock:
+            if self.http is not None:
+                return
+            limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            self.http = httpx.Client(limits=limits, timeout=self.timeout, follow_redirects=True)
+
+    def stop(self):
+        """Close the shared client and its connections."""
+        with self._lock:
+            if self.http is None:
+                return
+            self.http.close()
+            self.http = None
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the shared client; returns an httpx.Response."""
+        return self.http.request(method, url, **kwargs)
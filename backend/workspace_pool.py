@@ -0,0 +1,49 @@
+import threading
+from collections import Counter
+
+
+class NoEligibleWorkspace(Exception):
+    """Raised when every workspace in the pool is locked or could not be inspected."""
+
+
+class WorkspacePool:
+    """
+    The HCP Terraform workspaces runs are spread across. HCP Terraform executes one run
+    at a time per workspace, so new runs go to the workspace with the shortest queue.
+
+    Queue depths come from the runs API, but a run only shows up there once its
+    configuration has been uploaded. Until then the chosen workspace is held by a local
+    reservation that counts towards its depth, so concurrent uploads in this process
+    don't all pile onto the same workspace. Callers release the reservation once the
+    run is visible upstream (or the upload failed).
+    """
+
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(names))
+        self.workspace_ids = {}  # name -> workspace ID; IDs never change, so lookups are cached
+        self._reserved = Counter()
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def acquire(self, queue_depths):
+        """
+        Reserve the least-busy eligible workspace and return its name. queue_depths maps
+        eligible workspace names to the number of unfinished runs reported upstream;
+        names missing from it (locked or unreachable) are skipped. Ties go to the
+        workspace listed first.
+        """
+        with self._lock:
+            candidates = [name for name in self.names if name in queue_depths]
+            if not candidates:
+                raise NoEligibleWorkspace("No eligible workspace: every workspace in the pool is locked or unreachable.")
+            chosen = min(candidates, key=lambda name: queue_depths[name] + self._reserved[name])
+            self._reserved[chosen] += 1
+            return chosen
+
+    def release(self, name):
+        """Drop a reservation taken by acquire()."""
+        with self._lock:
+            if self._reserved[name] > 0:
+                self._reserved[name] -= 1
@@ -0,0 +1,12 @@
+"""
+Production entry point. Run with:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Each worker imports this module after the fork, so every process gets its own
+upstream HTTP client from create_app() and builds its own MongoDB connection and
+OpenAI client on first use.
+"""
+from app import create_app
+
+app = create_app()
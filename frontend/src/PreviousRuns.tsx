@@ -61,6 +61,8 @@ const PreviousRuns: React.FC = () => {
           return aTime > bTime ? a : b;
         }, appliedRuns[0]); // Initial value is the first element of the array        
         setLatestAppliedId(latest.id);
+      } else {
+        setLatestAppliedId(null);
       }
       setError(null);
     } catch (err) {
@@ -73,14 +75,17 @@ const PreviousRuns: React.FC = () => {
 
   const handleDestroy = async () => {
     try {
+      // With several workspaces the backend needs a target; destroy the workspace of the
+      // latest applied run
       const res = await fetch("http://localhost:4000/destroy-run", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({}),
+        body: JSON.stringify(latestAppliedId ? { run_id: latestAppliedId } : {}),
       });
       if (!res.ok) {
         const body = await res.json();
-        throw new Error(body.message || "Unknown server error");
+        const message = body.error || body.message || "Unknown server error";
+        throw new Error(body.details ? `${message} ${body.details}` : message);
       }
       await fetchRuns();
     } catch (err: any) {